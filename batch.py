@@ -0,0 +1,141 @@
+from hardware import *
+from so import *
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+
+##
+##  BATCH
+##  corre muchas simulaciones independientes (una maquina por proceso) y junta las metricas
+##
+
+## los schedulers y politicas se eligen por nombre asi la configuracion se puede mandar a otro proceso
+SCHEDULERS = {
+    'fcfs': lambda kernel: SchedulerFCFS(kernel),
+    'rr': lambda kernel, quantum=3: SchedulerRoundRobin(quantum, kernel),
+    'priorityNonPreemptive': lambda kernel, agingRate=1: SchedulerPriorityNonPreemptive(kernel, agingRate),
+    'priorityPreemptive': lambda kernel, agingRate=1: SchedulerPriorityPreemptive(kernel, agingRate),
+    'mlfq': lambda kernel, **kwargs: SchedulerMLFQ(kernel, **kwargs),
+    'sjf': lambda kernel, **kwargs: SchedulerSJF(kernel, BurstEstimator(kernel, **kwargs)),
+    'srtf': lambda kernel, **kwargs: SchedulerSRTF(kernel, BurstEstimator(kernel, **kwargs)),
+    'cfs': lambda kernel, **kwargs: SchedulerCFS(kernel, **kwargs),
+}
+
+REPLACEMENT_POLICIES = {
+    'fifo': FIFOReplacementPolicy,
+    'lru': LRUReplacementPolicy,
+    'clock': ClockReplacementPolicy,
+    'lfu': LFUReplacementPolicy,
+}
+
+
+## una corrida: workload es una lista de (programa, prioridad, tick de llegada)
+class SimulationConfig():
+
+    def __init__(self, workload, scheduler='fcfs', memorySize=32, frameSize=4, cores=1,
+                 replacementPolicy='lru', schedulerArgs=None, maxTicks=100000, name=None, swapLatency=None,
+                 readAhead=None, admissionControl=None):
+        self.workload = workload
+        self.scheduler = scheduler
+        self.memorySize = memorySize
+        self.frameSize = frameSize
+        self.cores = cores
+        self.replacementPolicy = replacementPolicy
+        self.schedulerArgs = schedulerArgs or {}
+        self.maxTicks = maxTicks
+        self.name = name
+        self.swapLatency = swapLatency
+        self.readAhead = readAhead
+        ## parametros de PFFAdmissionControl (None: sin control de admision)
+        self.admissionControl = admissionControl
+
+    def __repr__(self):
+        return "SimulationConfig({name} {scheduler} mem={memorySize} frame={frameSize} cores={cores} {policy})".format(
+            name=self.name, scheduler=self.scheduler, memorySize=self.memorySize, frameSize=self.frameSize,
+            cores=self.cores, policy=self.replacementPolicy)
+
+
+## corre una configuracion de punta a punta en tiempo virtual y devuelve sus metricas
+def runSimulation(config):
+    machine = Hardware(config.memorySize, ticksPerSecond=None, skipIdleTicks=True, cores=config.cores,
+                       swapLatency=config.swapLatency)
+    machine.mmu.frameSize = config.frameSize
+    readAhead = ReadAhead(config.readAhead) if config.readAhead else None
+    kernel = Kernel(REPLACEMENT_POLICIES[config.replacementPolicy](), hardware=machine, readAhead=readAhead)
+    kernel.useSchedulers(lambda: SCHEDULERS[config.scheduler](kernel, **config.schedulerArgs))
+    if config.admissionControl is not None:
+        kernel.admissionControl = PFFAdmissionControl(kernel, **config.admissionControl)
+
+    for program, priority, arrival in config.workload:
+        kernel.fileSystem.write(program.name, program)
+        kernel.runAt(arrival, program.name, priority)
+
+    ticks = machine.switchOn(maxTicks=config.maxTicks,
+                             until=lambda: machine.clock.pendingEvents == 0 and kernel.allTerminated())
+
+    finished = [pcb for pcb in kernel.getPCBTable if pcb.finishTick is not None]
+    turnarounds = [pcb.finishTick - pcb.arrivalTick for pcb in finished]
+    tlbHits = sum(core.mmu.tlb.hits for core in machine.cores)
+    tlbMisses = sum(core.mmu.tlb.misses for core in machine.cores)
+    return {
+        'name': config.name,
+        'scheduler': config.scheduler,
+        'memorySize': config.memorySize,
+        'frameSize': config.frameSize,
+        'cores': config.cores,
+        'replacementPolicy': config.replacementPolicy,
+        'swapLatency': config.swapLatency,
+        'readAhead': config.readAhead,
+        'ticks': ticks,
+        'finished': len(finished),
+        'programs': len(config.workload),
+        'meanTurnaround': sum(turnarounds) / len(turnarounds) if turnarounds else None,
+        'maxTurnaround': max(turnarounds) if turnarounds else None,
+        'pageFaults': kernel.pageFaults,
+        'suspensions': kernel.admissionControl.suspensions if kernel.admissionControl else 0,
+        'swapWrites': kernel.swapSpace.writes,
+        'tlbHitRate': tlbHits / (tlbHits + tlbMisses) if tlbHits + tlbMisses else None,
+    }
+
+
+## corre todas las configuraciones en un pool de procesos (cada corrida arma su propia maquina)
+## y devuelve las metricas en el mismo orden que configs. workers=1 corre todo en este proceso
+def runBatch(configs, workers=None):
+    if workers == 1:
+        return [runSimulation(config) for config in configs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(runSimulation, configs))
+
+
+## arma las configuraciones del producto cartesiano de los parametros
+def sweep(workload, schedulers=('fcfs',), memorySizes=(32,), frameSizes=(4,), cores=(1,),
+          replacementPolicies=('lru',), **kwargs):
+    return [SimulationConfig(workload, scheduler, memorySize, frameSize, nCores, policy, **kwargs)
+            for scheduler, memorySize, frameSize, nCores, policy
+            in product(schedulers, memorySizes, frameSizes, cores, replacementPolicies)]
+
+
+RESULT_COLUMNS = ['scheduler', 'memorySize', 'frameSize', 'cores', 'replacementPolicy', 'swapLatency',
+                  'readAhead', 'ticks', 'finished', 'meanTurnaround', 'maxTurnaround', 'pageFaults', 'swapWrites',
+                  'tlbHitRate']
+
+## una fila por corrida, lista para imprimir
+def resultTable(results, columns=RESULT_COLUMNS):
+    rows = [[result[column] for column in columns] for result in results]
+    return tabulate(rows, headers=columns, tablefmt="psql", floatfmt=".2f")
+
+
+if __name__ == '__main__':
+    workload = [
+        (Program("prg1.exe", [ASM.CPU(2), ASM.IO(), ASM.CPU(3), ASM.IO(), ASM.CPU(2)]), 1, 0),
+        (Program("prg2.exe", [ASM.CPU(7)]), 2, 0),
+        (Program("prg3.exe", [ASM.CPU(4), ASM.IO(), ASM.CPU(1)]), 3, 0),
+        (Program("prg4.exe", [ASM.CPU(20), ASM.IO(), ASM.CPU(10)]), 0, 5),
+        (Program("prg5.exe", [ASM.CPU(3), ASM.IO(), ASM.CPU(3), ASM.IO(), ASM.CPU(3)]), 4, 12),
+    ]
+    configs = sweep(workload,
+                    schedulers=('fcfs', 'rr', 'priorityPreemptive', 'mlfq', 'srtf', 'cfs'),
+                    memorySizes=(8, 16, 32),
+                    frameSizes=(4,),
+                    replacementPolicies=('lru', 'clock'))
+    print(resultTable(runBatch(configs)))
@@ -0,0 +1,103 @@
+from hardware import *
+from so import *
+from batch import *
+from time import perf_counter
+import tempfile
+import os
+import gc
+
+
+##
+##  BENCHMARKS
+##  micro-benchmarks de las estructuras del kernel y del MMU (no prenden el reloj)
+##
+
+def benchReadyQueue(schedulerClass=SchedulerFCFS, sizes=(10, 100, 1000, 10000, 100000), dispatches=10000):
+    # costo de un dispatch (get_next + add) con la ready queue llena de "size" PCBs
+    print(schedulerClass.__name__)
+    rows = []
+    for size in sizes:
+        scheduler = schedulerClass(None)
+        for pid in range(size):
+            scheduler.add(PCB(pid, {}, "bench.exe", pid % 5))
+        start = perf_counter()
+        for _ in range(dispatches):
+            scheduler.add(scheduler.get_next())
+        elapsed = perf_counter() - start
+        rows.append([size, round(elapsed / dispatches * 1e9)])
+    print(tabulate(rows, headers=["PCBs en ready queue", "ns por dispatch"], tablefmt="psql"))
+
+
+def benchFetch(sizes=(256, 1024, 4096, 16384, 65536), fetches=100000, frameSize=4):
+    # costo de un fetch (TLB / page table + orden LRU) con "size" paginas cargadas
+    # se recorren las paginas en orden (una por fetch): nunca pega en el TLB (64 entradas)
+    # y cada fetch lleva al final del orden LRU el frame usado hace mas tiempo
+    print("MMU.fetch")
+    rows = []
+    for size in sizes:
+        machine = Hardware(size * frameSize, ticksPerSecond=None)
+        mmu = machine.mmu
+        mmu.frameSize = frameSize
+        mmu.limit = size * frameSize - 1
+        mmu.switchAddressSpace(0, {pageId: pageId for pageId in range(size)})
+        for frameId in range(size):
+            mmu.frameLoaded(frameId)
+        addresses = [i % size * frameSize for i in range(fetches)]
+        start = perf_counter()
+        for address in addresses:
+            mmu.fetch(address)
+        elapsed = perf_counter() - start
+        rows.append([size, round(elapsed / fetches * 1e9)])
+    print(tabulate(rows, headers=["paginas cargadas", "ns por fetch"], tablefmt="psql"))
+
+def benchFork(memorySizes=(1 << 16, 1 << 20, 1 << 22), frameSize=4, ticks=50):
+    # costo de Kernel.fork con un proceso chico corriendo en maquinas cada vez mas grandes, contra
+    # un checkpoint del mismo kernel. Las tablas por frame se copian de una vez y la memoria es
+    # copy-on-write: el fork no copia bloques y tiene que salir mas barato que el checkpoint
+    print("Kernel.fork")
+    rows = []
+    for memorySize in memorySizes:
+        machine = Hardware(memorySize, ticksPerSecond=None, skipIdleTicks=True)
+        machine.mmu.frameSize = frameSize
+        kernel = Kernel(hardware=machine)
+        kernel.useSchedulers(lambda: SchedulerFCFS(kernel))
+        kernel.fileSystem.write("bench.exe", Program("bench.exe", [ASM.CPU(200)]))
+        kernel.runAt(0, "bench.exe", 0)
+        machine.switchOn(maxTicks=ticks)
+        # que no entre en la medicion una pasada del gc por la basura de los benchmarks anteriores
+        gc.collect()
+        start = perf_counter()
+        clone = kernel.fork()
+        forkElapsed = perf_counter() - start
+        with tempfile.TemporaryDirectory() as directory:
+            start = perf_counter()
+            kernel.checkpoint(os.path.join(directory, "bench.ckpt"))
+            checkpointElapsed = perf_counter() - start
+        assert clone.hardware.memory.copiedBlocks == 0, "el fork copio bloques de memoria"
+        assert forkElapsed < checkpointElapsed, "fork ({fork:.3f}s) mas caro que un checkpoint ({checkpoint:.3f}s)".format(
+            fork=forkElapsed, checkpoint=checkpointElapsed)
+        rows.append([memorySize, memorySize // frameSize, round(forkElapsed * 1e3, 1), round(checkpointElapsed * 1e3, 1)])
+    print(tabulate(rows, headers=["celdas", "frames", "ms por fork", "ms por checkpoint"], tablefmt="psql"))
+
+def checkSwapProgress(programs=(4, 5, 6, 8), maxTicks=3000):
+    # regresion: con swap y mas procesos listos que frames todos tienen que terminar
+    # (16 celdas = 4 frames), con cualquier politica de reemplazo, scheduler y cantidad de cores
+    configs = []
+    for n in programs:
+        workload = [(Program("p%d.exe" % i, [ASM.CPU(3 + i), ASM.IO(), ASM.CPU(9 + i * 3), ASM.IO(), ASM.CPU(5)]), i % 3, 0)
+                    for i in range(n)]
+        configs += sweep(workload, schedulers=('fcfs', 'rr', 'mlfq', 'srtf', 'cfs'), memorySizes=(16,), cores=(1, 2),
+                         replacementPolicies=('lru', 'fifo', 'clock', 'lfu'), swapLatency=2, maxTicks=maxTicks,
+                         name="%d programas" % n)
+    results = runBatch(configs)
+    print(resultTable([result for result in results if result['scheduler'] == 'fcfs' and result['cores'] == 1]))
+    stuck = [result for result in results if result['finished'] != result['programs']]
+    assert not stuck, "no terminaron todos los procesos: {stuck}".format(stuck=stuck)
+
+
+if __name__ == '__main__':
+    benchReadyQueue(SchedulerFCFS)
+    benchReadyQueue(SchedulerPriorityNonPreemptive)
+    benchFetch()
+    benchFork()
+    checkSwapProgress()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python
 
 from tabulate import tabulate
-from time import sleep
+from time import sleep, perf_counter
 from threading import Thread, Lock
+from itertools import count
+from collections import OrderedDict
+import heapq
+import copy
+import mmap
+import os
 import log
 
 ##  Estas son la instrucciones soportadas por nuestro CPU
@@ -10,13 +16,63 @@ INSTRUCTION_IO = 'IO'
 INSTRUCTION_CPU = 'CPU'
 INSTRUCTION_EXIT = 'EXIT'
 
+## la memoria guarda un byte por celda: tabla de traduccion instruccion <-> opcode
+## (el 0 es la celda vacia; otros valores que se escriban se agregan a la tabla hasta 256)
+OPCODE_VALUES = ['', INSTRUCTION_CPU, INSTRUCTION_IO, INSTRUCTION_EXIT]
+OPCODES = {value: opcode for opcode, value in enumerate(OPCODE_VALUES)}
+
+def opcodeOf(value):
+    opcode = OPCODES.get(value)
+    if opcode is None:
+        if len(OPCODE_VALUES) == 256:
+            raise Exception("Memory can not store more than 256 distinct values: {value}".format(value=value))
+        opcode = len(OPCODE_VALUES)
+        OPCODE_VALUES.append(value)
+        OPCODES[value] = opcode
+    return opcode
+
+
+## una racha de la misma instruccion repetida, sin expandirla en memoria de Python
+class InstructionRun():
+
+    def __init__(self, instruction, times):
+        self._instruction = instruction
+        self._times = times
+
+    @property
+    def instruction(self):
+        return self._instruction
+
+    @property
+    def times(self):
+        return self._times
+
+    def __len__(self):
+        return self._times
+
+    def __iter__(self):
+        for _ in range(self._times):
+            yield self._instruction
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._instruction] * len(range(*index.indices(self._times)))
+        if index < 0:
+            index += self._times
+        if not (0 <= index < self._times):
+            raise IndexError("InstructionRun index out of range")
+        return self._instruction
+
+    def __repr__(self):
+        return "{instruction} x {times}".format(instruction=self._instruction, times=self._times)
+
 
 ## Helper for emulated machine code
 class ASM():
 
     @classmethod
     def EXIT(self, times):
-        return [INSTRUCTION_EXIT] * times
+        return InstructionRun(INSTRUCTION_EXIT, times)
 
     @classmethod
     def IO(self):
@@ -24,7 +80,7 @@ class ASM():
 
     @classmethod
     def CPU(self, times):
-        return [INSTRUCTION_CPU] * times
+        return InstructionRun(INSTRUCTION_CPU, times)
 
     @classmethod
     def isEXIT(self, instruction):
@@ -43,6 +99,13 @@ NEW_INTERRUPTION_TYPE = "#NEW"
 TIMEOUT_INTERRUPTION_TYPE = "#TIMEOUT"
 STAT_INTERRUPTION_TYPE = "#STAT"
 PAGE_FAULT_INTERRUPTION_TYPE = "#PAGE_FAULT"
+PAGE_IN_INTERRUPTION_TYPE = "#PAGE_IN"
+
+
+## el page fault no se resolvio en el momento: el proceso quedo esperando la pagina (swap)
+## y la instruccion se vuelve a intentar cuando lo despachen de nuevo
+class PageFaultPending(Exception):
+    pass
 
 ## emulates an Interrupt request
 class IRQ:
@@ -67,6 +130,16 @@ class InterruptVector():
         self._handlers = dict()
         self.lock = Lock()
 
+    ## el lock no se guarda en un checkpoint: se crea uno nuevo al restaurar
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
     def register(self, interruptionType, interruptionHandler):
         self._handlers[interruptionType] = interruptionHandler
 
@@ -87,10 +160,21 @@ class InterruptVector():
 ## emulates the Internal Clock
 class Clock():
 
-    def __init__(self):
+    ## ticksPerSecond: cantidad de ticks por segundo de reloj real
+    ## si es None el tiempo es puramente virtual (los ticks corren uno atras de otro)
+    ## skipIdleTicks: en run() avanza en bloque hasta el proximo tick donde puede pasar algo
+    ## (fin de IO, timeout, llegada de un programa, o una instruccion que no sea CPU)
+    def __init__(self, ticksPerSecond=1, skipIdleTicks=False):
         self._subscribers = []
         self._running = False
         self._currentTick = 0
+        self._nextTick = 0
+        self._ticksPerSecond = ticksPerSecond
+        self._lastTickTime = None
+        self._skipIdleTicks = skipIdleTicks
+        ## eventos agendados: heap de (tickNbr, orden, accion)
+        self._events = []
+        self._eventOrder = count()
 
     def addSubscriber(self, subscriber):
         self._subscribers.append(subscriber)
@@ -98,6 +182,15 @@ class Clock():
     def stop(self):
         self._running = False
 
+    ## cantidad de eventos agendados que todavia no se dispararon
+    @property
+    def pendingEvents(self):
+        return len(self._events)
+
+    ## agenda una accion (sin parametros) para que se ejecute al comienzo del tick tickNbr
+    def schedule(self, tickNbr, action):
+        heapq.heappush(self._events, (tickNbr, next(self._eventOrder), action))
+
     def start(self):
         if not self._running:
             log.logger.info("---- :::: START CLOCK  ::: -----")
@@ -106,19 +199,87 @@ class Clock():
             t.start()
 
     def __start(self):
-        tickNbr = 0
         while (self._running):
-            self.tick(tickNbr)
-            tickNbr += 1
+            self.tick(self._nextTick)
+
+    ## corre el reloj de forma sincronica hasta agotar maxTicks o hasta que se cumpla la condicion until()
+    ## devuelve la cantidad de ticks ejecutados
+    def run(self, maxTicks=None, until=None):
+        log.logger.info("---- :::: RUN CLOCK maxTicks: {maxTicks} ::: -----".format(maxTicks=maxTicks))
+        self._running = True
+        executed = 0
+        while self._running and (maxTicks is None or executed < maxTicks):
+            if until is not None and until():
+                break
+            if self._skipIdleTicks:
+                budget = None if maxTicks is None else maxTicks - executed
+                skipped = self._skipIdle(budget)
+                if skipped is None:
+                    ## no hay nada que pueda volver a pasar en la maquina
+                    break
+                executed += skipped
+                if skipped and budget is not None and skipped >= budget:
+                    break
+            self.tick(self._nextTick)
+            executed += 1
+        self._running = False
+        return executed
+
+    ## avanza en bloque los ticks "quietos" (sin interrupciones ni eventos) de todos los subscribers
+    ## devuelve la cantidad de ticks avanzados, o None si ya no queda ningun evento posible
+    def _skipIdle(self, budget):
+        idle = None
+        for subscriber in self._subscribers:
+            ticks = subscriber.quietTicks()
+            if ticks is not None and (idle is None or ticks < idle):
+                idle = ticks
+        if self._events:
+            untilEvent = max(0, self._events[0][0] - self._nextTick)
+            if idle is None or untilEvent < idle:
+                idle = untilEvent
+        if idle is None:
+            if budget is None:
+                return None
+            idle = budget
+        if budget is not None:
+            idle = min(idle, budget)
+        if idle > 0:
+            log.logger.info("        --------------- skip ticks: {first} - {last} ---------------".format(first=self._nextTick, last=self._nextTick + idle - 1))
+            ## mientras avanzan, los subscribers ven como tick actual el primero del bloque
+            self._currentTick = self._nextTick
+            for subscriber in self._subscribers:
+                subscriber.advance(idle)
+            self._nextTick += idle
+            self._currentTick = self._nextTick - 1
+            self._wait(idle)
+        return idle
 
     def tick(self, tickNbr):
         self._currentTick = tickNbr
+        self._nextTick = tickNbr + 1
         log.logger.info("        --------------- tick: {tickNbr} ---------------".format(tickNbr = tickNbr))
+        ## ejecutamos los eventos agendados para este tick (ej: llegada de programas)
+        while self._events and self._events[0][0] <= tickNbr:
+            heapq.heappop(self._events)[2]()
         ## notify all subscriber that a new clock cycle has started
         for subscriber in self._subscribers:
             subscriber.tick(tickNbr)
-        ## wait 1 second and keep looping
-        sleep(1)
+        ## esperamos lo que corresponda segun el rate configurado y seguimos
+        self._wait()
+
+    def _wait(self, ticks=1):
+        if self._ticksPerSecond is None:
+            return
+        period = ticks / self._ticksPerSecond
+        now = perf_counter()
+        if self._lastTickTime is not None:
+            ## descontamos el tiempo que ya se consumio procesando el tick
+            remaining = period - (now - self._lastTickTime)
+            if remaining > 0:
+                sleep(remaining)
+        else:
+            sleep(period)
+        self._lastTickTime = perf_counter()
 
     def do_ticks(self, times):
         log.logger.info("---- :::: CLOCK do_ticks: {times} ::: -----".format(times=times))
@@ -129,43 +290,421 @@ class Clock():
     def currentTick(self):
         return self._currentTick
 
+    @property
+    def nextTick(self):
+        return self._nextTick
+
+    @property
+    def skipIdleTicks(self):
+        return self._skipIdleTicks
+
+    @skipIdleTicks.setter
+    def skipIdleTicks(self, skipIdleTicks):
+        self._skipIdleTicks = skipIdleTicks
+
+    @property
+    def ticksPerSecond(self):
+        return self._ticksPerSecond
+
+    @ticksPerSecond.setter
+    def ticksPerSecond(self, ticksPerSecond):
+        self._ticksPerSecond = ticksPerSecond
+        self._lastTickTime = None
+
 ## emulates the main memory (RAM)
 class Memory():
 
-    def __init__(self, size):
+    ## cada celda es un opcode de un byte (ver OPCODES); read/write traducen en el borde.
+    ## Las celdas se guardan en bloques de blockSize para poder compartirlos copy-on-write entre
+    ## una maquina y sus forks: un bloque compartido se copia recien cuando alguno lo escribe
+    ## backingFile: si se indica, la memoria es un mmap de ese archivo (se crea o se agranda si hace falta
+    ## y se respeta lo que ya tenga). Los bloques son memoryviews sobre el mapa, sin copias
+    def __init__(self, size, blockSize=1024, backingFile=None):
         self._size = size
-        self._cells = [''] * size
+        self._blockSize = blockSize
+        self._backingFile = backingFile
+        self._mmap = None
+        self._view = None
+        blocks = (size + blockSize - 1) // blockSize
+        if backingFile is None:
+            self._blocks = [bytearray(blockSize) for _ in range(blocks)]
+        else:
+            length = blocks * blockSize
+            fd = os.open(backingFile, os.O_RDWR | os.O_CREAT)
+            try:
+                if os.fstat(fd).st_size < length:
+                    os.ftruncate(fd, length)
+                self._mmap = mmap.mmap(fd, length)
+            finally:
+                os.close(fd)
+            self._view = memoryview(self._mmap)
+            self._blocks = [self._view[start:start + blockSize] for start in range(0, length, blockSize)]
+        self._shared = [False] * blocks
+        self._copiedBlocks = 0
 
     def write(self, addr, value):
-        self._cells[addr] = value
+        if addr >= self._size:
+            raise IndexError("memory address {addr} out of range".format(addr=addr))
+        block, offset = divmod(addr, self._blockSize)
+        if self._shared[block]:
+            self._blocks[block] = bytearray(self._blocks[block])
+            self._shared[block] = False
+            self._copiedBlocks += 1
+        self._blocks[block][offset] = opcodeOf(value)
+
+    ## valores de las celdas [addr, addr + length)
+    def readCells(self, addr, length):
+        if addr + length > self._size:
+            raise IndexError("memory address {addr} out of range".format(addr=addr + length - 1))
+        values = []
+        while length > 0:
+            block, offset = divmod(addr, self._blockSize)
+            chunk = bytes(self._blocks[block][offset:offset + length])
+            values.extend(OPCODE_VALUES[opcode] for opcode in chunk)
+            addr += len(chunk)
+            length -= len(chunk)
+        return values
+
+    ## escribe values en celdas consecutivas desde addr, de a un bloque por vez
+    def writeCells(self, addr, values):
+        self.writeOpcodes(addr, bytes(opcodeOf(value) for value in values))
+
+    ## igual que writeCells pero con las celdas ya codificadas (ver opcodeOf)
+    def writeOpcodes(self, addr, opcodes):
+        if addr + len(opcodes) > self._size:
+            raise IndexError("memory address {addr} out of range".format(addr=addr + len(opcodes) - 1))
+        written = 0
+        while written < len(opcodes):
+            block, offset = divmod(addr + written, self._blockSize)
+            if self._shared[block]:
+                self._blocks[block] = bytearray(self._blocks[block])
+                self._shared[block] = False
+                self._copiedBlocks += 1
+            chunk = opcodes[written:written + self._blockSize - offset]
+            self._blocks[block][offset:offset + len(chunk)] = chunk
+            written += len(chunk)
 
     def read(self, addr):
-        return self._cells[addr]
+        if addr >= self._size:
+            raise IndexError("memory address {addr} out of range".format(addr=addr))
+        block, offset = divmod(addr, self._blockSize)
+        return OPCODE_VALUES[self._blocks[block][offset]]
+
+    ## cantidad de celdas consecutivas iguales a value desde addr (como mucho maxCells)
+    def countRun(self, addr, value, maxCells):
+        opcode = OPCODES.get(value)
+        if opcode is None:
+            return 0
+        pattern = bytes((opcode,))
+        end = min(addr + maxCells, self._size)
+        run = 0
+        while addr < end:
+            block, offset = divmod(addr, self._blockSize)
+            cells = bytes(self._blocks[block][offset:offset + end - addr])
+            same = len(cells) - len(cells.lstrip(pattern))
+            run += same
+            if same < len(cells):
+                break
+            addr += same
+        return run
+
+    ## copia de la memoria que comparte todos los bloques con esta (los dos lados quedan copy-on-write)
+    ## una memoria mapeada sigue escribiendo en su archivo, asi que el fork se lleva una copia en el heap
+    def fork(self):
+        clone = Memory.__new__(Memory)
+        clone._size = self._size
+        clone._blockSize = self._blockSize
+        clone._copiedBlocks = 0
+        clone._backingFile = None
+        clone._mmap = None
+        clone._view = None
+        if self._mmap is None:
+            clone._blocks = self._blocks[:]
+            clone._shared = [True] * len(self._blocks)
+            self._shared = [True] * len(self._blocks)
+        else:
+            clone._blocks = [bytearray(block) for block in self._blocks]
+            clone._shared = [False] * len(self._blocks)
+        return clone
+
+    def __deepcopy__(self, memo):
+        return self.fork()
+
+    ## el checkpoint lleva la tabla de opcodes: si en el proceso que restaura quedo distinta se traduce
+    ## (una memoria mapeada se restaura en el heap de Python)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_opcodeValues'] = OPCODE_VALUES[:]
+        if self._mmap is not None:
+            state['_blocks'] = [bytearray(block) for block in self._blocks]
+            state['_backingFile'] = None
+            state['_mmap'] = None
+            state['_view'] = None
+        return state
+
+    def __setstate__(self, state):
+        values = state.pop('_opcodeValues')
+        self.__dict__.update(state)
+        table = bytes(opcodeOf(value) for value in values)
+        if table != bytes(range(len(values))):
+            table = table + bytes(256 - len(table))
+            self._blocks = [bytearray(block.translate(table)) for block in self._blocks]
+
+    ## baja a disco el contenido del mapa: el archivo queda como snapshot de la memoria
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+    def close(self):
+        if self._mmap is not None:
+            self.flush()
+            for block in self._blocks:
+                if isinstance(block, memoryview):
+                    block.release()
+            self._view.release()
+            self._blocks = []
+            self._view = None
+            self._mmap.close()
+            self._mmap = None
 
     @property
     def size(self):
         return self._size
 
+    @property
+    def backingFile(self):
+        return self._backingFile
+
+    ## bloques que se tuvieron que copiar por escrituras despues de un fork
+    @property
+    def copiedBlocks(self):
+        return self._copiedBlocks
+
+    def cells(self):
+        return [OPCODE_VALUES[opcode] for block in self._blocks for opcode in bytes(block)][:self._size]
+
     def __repr__(self):
-        return tabulate(enumerate(self._cells), tablefmt='psql')
+        return tabulate(enumerate(self.cells()), tablefmt='psql')
         ##return "Memoria = {mem}".format(mem=self._cells)
 
+## emulates a set-associative Translation Lookaside Buffer
+## las entradas se etiquetan con el address space id (ASID) del proceso,
+## asi sobreviven a los cambios de contexto
+class TLB():
+
+    def __init__(self, entries=64, associativity=4):
+        if entries <= 0 or associativity <= 0 or entries % associativity:
+            raise Exception("Invalid TLB geometry: {entries} entries, associativity {associativity}".format(entries=entries, associativity=associativity))
+        self._entries = entries
+        self._associativity = associativity
+        ## cada set es un OrderedDict (asid, pageId) -> frameId, del menos al mas recientemente usado
+        self._sets = [OrderedDict() for _ in range(entries // associativity)]
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _setOf(self, asid, pageId):
+        return self._sets[(pageId ^ (asid or 0)) % len(self._sets)]
+
+    ## busca la traduccion y cuenta el hit/miss; devuelve None si no esta
+    def lookup(self, asid, pageId):
+        tlbSet = self._setOf(asid, pageId)
+        key = (asid, pageId)
+        frameId = tlbSet.get(key)
+        if frameId is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            tlbSet.move_to_end(key)
+        return frameId
+
+    ## busca la traduccion sin tocar contadores ni el orden de reemplazo
+    def peek(self, asid, pageId):
+        return self._setOf(asid, pageId).get((asid, pageId))
+
+    def countHits(self, times):
+        self._hits += times
+
+    def insert(self, asid, pageId, frameId):
+        tlbSet = self._setOf(asid, pageId)
+        key = (asid, pageId)
+        if key not in tlbSet and len(tlbSet) >= self._associativity:
+            tlbSet.popitem(last=False)
+            self._evictions += 1
+        tlbSet[key] = frameId
+        tlbSet.move_to_end(key)
+
+    def invalidate(self, asid, pageId):
+        self._setOf(asid, pageId).pop((asid, pageId), None)
+
+    def flush(self):
+        for tlbSet in self._sets:
+            tlbSet.clear()
+
+    @property
+    def entries(self):
+        return self._entries
+
+    @property
+    def associativity(self):
+        return self._associativity
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __repr__(self):
+        return "TLB(entries={entries}, associativity={associativity}, hits={hits}, misses={misses}, evictions={evictions})".format(
+            entries=self._entries, associativity=self._associativity, hits=self._hits, misses=self._misses, evictions=self._evictions)
+
+
+## emulates the per-frame flags of physical memory (reference, dirty, use count, LRU order)
+## es una sola para toda la memoria: la comparten los MMUs de todos los cores
+class FrameTable():
+
+    def __init__(self, memory, clock):
+        self._memory = memory
+        self._clock = clock
+        self._frameSize = 0
+        self._mmus = []
+        #agrego los usos de los frames ordenados del menos al mas recientemente usado
+        #(OrderedDict: tocar y desalojar un frame es O(1))
+        self.access = OrderedDict()
+        #flags por frame para los algoritmos de seleccion de victima
+        self.referenced = bytearray()
+        self.dirty = bytearray()
+        #frames de solo lectura (paginas de codigo compartidas entre procesos)
+        self.readOnly = bytearray()
+        self.useCount = []
+        #tick del ultimo acceso a cada frame (para estimar working sets)
+        self.lastAccess = []
+        #cantidad de referencias a paginas distintas de la anterior (posicion en la traza)
+        self.references = 0
+        self.trace = None
+
+    ## tablas planas por frame: en un fork se copian de una vez (copy.deepcopy iria elemento por
+    ## elemento y un fork costaria segun los frames de la maquina y no segun lo que se modifica)
+    FLAT_TABLES = ('referenced', 'dirty', 'readOnly', 'useCount', 'lastAccess')
+
+    def __deepcopy__(self, memo):
+        clone = FrameTable.__new__(FrameTable)
+        memo[id(self)] = clone
+        for name, value in self.__dict__.items():
+            if name in FrameTable.FLAT_TABLES:
+                clone.__dict__[name] = value[:]
+            else:
+                clone.__dict__[name] = copy.deepcopy(value, memo)
+        return clone
+
+    def attach(self, mmu):
+        self._mmus.append(mmu)
+
+    @property
+    def frameSize(self):
+        return self._frameSize
+
+    @frameSize.setter
+    def frameSize(self, frameSize):
+        self._frameSize = frameSize
+        frames = self._memory.size // frameSize
+        self.referenced = bytearray(frames)
+        self.dirty = bytearray(frames)
+        self.readOnly = bytearray(frames)
+        self.useCount = [0] * frames
+        self.lastAccess = [0] * frames
+        self.access = OrderedDict()
+        for mmu in self._mmus:
+            mmu._frameSize = frameSize
+            mmu._lastFrame = None
+
+    def clear(self, frameId):
+        self.referenced[frameId] = 0
+        self.dirty[frameId] = 0
+        self.readOnly[frameId] = 0
+        self.useCount[frameId] = 0
+        for mmu in self._mmus:
+            if mmu._lastFrame == frameId:
+                mmu._lastFrame = None
+
+    ## tick del ultimo uso del frame: si algun MMU lo esta usando ahora, el tick actual
+    def lastUse(self, frameId):
+        for mmu in self._mmus:
+            if mmu._lastFrame == frameId:
+                return self._clock.currentTick
+        return self.lastAccess[frameId]
+
+
 ## emulates the Memory Management Unit (MMU)
 class MMU():
 
-    def __init__(self, memory):
+    ## interruptVector y clock: los de la maquina a la que pertenece (para el page fault y los ticks de acceso)
+    def __init__(self, memory, interruptVector, clock, tlbEntries=64, tlbAssociativity=4, frameTable=None):
         self._memory = memory
-        self._frameSize = 0
+        self._interruptVector = interruptVector
+        self._clock = clock
         self._limit = 999
-        self._tlb = dict()
-        
-        #agrego una lista de usos
-        self._access = []
+        self._tlb = TLB(tlbEntries, tlbAssociativity)
+        ## page table del proceso cargado (la del PCB, no una copia)
+        self._pageTable = dict()
+        self._asid = None
+        self._lastFrame = None
+
+        ## flags de los frames (compartidos si hay varios cores)
+        if frameTable is None:
+            frameTable = FrameTable(memory, clock)
+        self._frames = frameTable
+        self._frameSize = frameTable.frameSize
+        frameTable.attach(self)
+
+    @property
+    def frameTable(self):
+        return self._frames
 
     @property
     def access(self):
-        return self._access
+        return self._frames.access
+
+    ## id del proceso (address space) cargado en el MMU
+    @property
+    def asid(self):
+        return self._asid
 
+    @asid.setter
+    def asid(self, asid):
+        self._asid = asid
+        self._lastFrame = None
+
+    @property
+    def referenced(self):
+        return self._frames.referenced
+
+    @property
+    def dirty(self):
+        return self._frames.dirty
+
+    @property
+    def useCount(self):
+        return self._frames.useCount
+
+    @property
+    def references(self):
+        return self._frames.references
+
+    ## empieza a grabar la traza de referencias (asid, pageId) para el algoritmo optimo
+    def recordTrace(self):
+        self._frames.trace = []
+
+    @property
+    def trace(self):
+        return self._frames.trace
 
     @property
     def limit(self):
@@ -181,13 +720,141 @@ class MMU():
 
     @frameSize.setter
     def frameSize(self, frameSize):
-        self._frameSize = frameSize
+        self._frames.frameSize = frameSize
+
+    ## el SO avisa que cargo una pagina en el frame: limpiamos sus flags
+    def frameLoaded(self, frameId):
+        self._frames.clear(frameId)
+        self._frames.lastAccess[frameId] = self._clock.currentTick
+        access = self._frames.access
+        access[frameId] = True
+        access.move_to_end(frameId)
+
+    ## el SO avisa que libero el frame
+    def frameFreed(self, frameId):
+        self._frames.access.pop(frameId, None)
+        self._frames.clear(frameId)
+
+    def clearReferenced(self, frameId):
+        self._frames.referenced[frameId] = 0
+
+    ## el SO marca el frame como de solo lectura (o lo vuelve a habilitar para escritura)
+    def setReadOnly(self, frameId, readOnly=True):
+        self._frames.readOnly[frameId] = 1 if readOnly else 0
+
+    @property
+    def readOnly(self):
+        return self._frames.readOnly
+
+    @property
+    def tlb(self):
+        return self._tlb
+
+    ## cambia la geometria del TLB (lo deja vacio y con los contadores en cero)
+    def configureTLB(self, entries, associativity):
+        self._tlb = TLB(entries, associativity)
+
+    ## cambio de contexto: el TLB no se vacia, sus entradas estan etiquetadas por asid
+    def switchAddressSpace(self, asid, pageTable):
+        self.asid = asid
+        self._pageTable = pageTable
 
     def resetTLB(self):
-        self._tlb = dict()
+        self._tlb.flush()
 
+    ## actualiza la page table cargada y descarta la traduccion vieja del TLB
     def setPageFrame(self, pageId, frameId):
-        self._tlb[pageId] = frameId
+        self._pageTable[pageId] = frameId
+        self._tlb.invalidate(self._asid, pageId)
+
+    ## la pagina de otro address space dejo de estar cargada
+    def invalidate(self, asid, pageId):
+        self._tlb.invalidate(asid, pageId)
+
+    ## traduce pagina -> frame: TLB, si no page table, y si no esta cargada page fault
+    def _translate(self, pageId, times=1):
+        asid = self._asid
+        frameId = self._tlb.lookup(asid, pageId)
+        if frameId is None:
+            frameId = self._pageTable[pageId]
+            if frameId is None :
+                pageFaultIRQ = IRQ(PAGE_FAULT_INTERRUPTION_TYPE, pageId)
+                self._interruptVector.handle(pageFaultIRQ)
+                # una vez resuelto el pageFault, volvemos a buscar en la Page Table
+                # ya que la pagina, ahora debe estar cargada si o si
+                # (salvo que el SO haya bloqueado al proceso hasta que llegue del swap)
+                if self._asid != asid:
+                    raise PageFaultPending(pageId)
+                frameId = self._pageTable[pageId]
+                if frameId is None:
+                    raise PageFaultPending(pageId)
+            self._tlb.insert(asid, pageId, frameId)
+        if times > 1:
+            self._tlb.countHits(times - 1)
+        return frameId
+
+    ## setea los flags de uso del frame; el orden LRU y la traza solo cambian cuando
+    ## se pasa a un frame distinto del ultimo referenciado
+    def _reference(self, frameId, pageId, times=1):
+        frames = self._frames
+        frames.referenced[frameId] = 1
+        frames.useCount[frameId] += times
+        if frameId != self._lastFrame:
+            now = self._clock.currentTick
+            if self._lastFrame is not None:
+                frames.lastAccess[self._lastFrame] = now
+            frames.lastAccess[frameId] = now
+            self._lastFrame = frameId
+            access = frames.access
+            if frameId in access:
+                access.move_to_end(frameId)
+            else:
+                access[frameId] = True
+            frames.references += 1
+            if frames.trace is not None:
+                frames.trace.append((self._asid, pageId))
+
+    ## devuelve el frame usado hace mas tiempo (None si no hay), salteando los de exclude
+    def leastRecentlyUsed(self, exclude=()):
+        if not exclude:
+            return next(iter(self._frames.access), None)
+        return next((frameId for frameId in self._frames.access if frameId not in exclude), None)
+
+    ## registra accesos a la direccion sin leerla (para la ejecucion en bloque del CPU)
+    def touch(self, logicalAddress, times=1):
+        pageId = logicalAddress // self._frameSize
+        self._reference(self._translate(pageId, times), pageId, times)
+
+    ## cantidad de instrucciones CPU consecutivas desde logicalAddress hasta el fin de su pagina
+    ## si la pagina no esta cargada devuelve 0 (el fetch normal se encarga del page fault)
+    def cpuRun(self, logicalAddress):
+        if logicalAddress > self._limit:
+            return 0
+        pageId = logicalAddress // self._frameSize
+        frameId = self._tlb.peek(self._asid, pageId)
+        if frameId is None:
+            frameId = self._pageTable.get(pageId)
+        if frameId is None:
+            return 0
+        offset = logicalAddress % self._frameSize
+        run = self._memory.countRun(self._frameSize * frameId + offset, INSTRUCTION_CPU, self._frameSize - offset)
+        return min(run, self._limit - logicalAddress + 1)
+
+    def _frameOf(self, logicalAddress):
+        if (logicalAddress > self._limit):
+            raise Exception("Invalid Address,  {logicalAddress} is higher than process limit: {limit}".format(limit = self._limit, logicalAddress = logicalAddress))
+        pageId = logicalAddress // self._frameSize
+        return pageId, self._translate(pageId)
+
+    ## escribe en la direccion logica y marca el frame como modificado (dirty)
+    ## los frames de solo lectura no se pueden escribir (los ven otros procesos)
+    def write(self, logicalAddress, value):
+        pageId, frameId = self._frameOf(logicalAddress)
+        if self._frames.readOnly[frameId]:
+            raise Exception("Invalid write, page {pageId} (frame {frameId}) is read-only".format(pageId=pageId, frameId=frameId))
+        self._reference(frameId, pageId)
+        self._frames.dirty[frameId] = 1
+        self._memory.write(self._frameSize * frameId + logicalAddress % self._frameSize, value)
 
     def fetch(self,  logicalAddress):
         if (logicalAddress > self._limit):
@@ -198,19 +865,11 @@ class MMU():
         offset = logicalAddress % self._frameSize
         #
         # buscamos la direccion Base del frame donde esta almacenada la pagina
-        frameId = self._tlb[pageId]
-        if frameId is None :
-            pageFaultIRQ = IRQ(PAGE_FAULT_INTERRUPTION_TYPE, pageId)
-            HARDWARE.interruptVector.handle(pageFaultIRQ)
-            # una vez resuelto el pageFault, volvemos a buscar en la Page Table
-            # ya que la pagina, ahora debe estar cargada si o si
-            frameId = self._tlb[pageId]
+        frameId = self._translate(pageId)
 
 
         ### setear los flags manejados por el MMU para los algoritmos de seleccion de victima
-        if pageId in self.access:
-            self.access.remove(pageId)
-        self.access.append(pageId)
+        self._reference(frameId, pageId)
 
 
         #
@@ -236,15 +895,40 @@ class Cpu():
     def tick(self, tickNbr):
         self._stats()
         if (self.isBusy()):
-            self._fetch()
-            self._decode()
-            self._execute()
+            if self._fetch():
+                self._decode()
+                self._execute()
         else:
             log.logger.info("cpu - NOOP")
 
+    ## ticks que vienen en los que el CPU no genera interrupciones (None = indefinidamente)
+    ## ocupado: la racha de instrucciones CPU que quedan en la pagina actual
+    def quietTicks(self):
+        if self._enable_stats:
+            return 0
+        if self.isBusy():
+            return self._mmu.cpuRun(self._pc)
+        return None
+
+    ## ejecuta en un solo paso ticks quietos (una racha de instrucciones CPU o NOOPs)
+    def advance(self, ticks):
+        if self.isBusy():
+            self._mmu.touch(self._pc, ticks)
+            self._pc += ticks
+            self._ir = INSTRUCTION_CPU
+            log.logger.info("cpu - Exec: {instr} x {ticks}, PC={pc}".format(instr=self._ir, ticks=ticks, pc=self._pc))
+        else:
+            log.logger.info("cpu - NOOP x {ticks}".format(ticks=ticks))
+
+    ## devuelve False si la instruccion quedo esperando una pagina (no avanza el pc)
     def _fetch(self):
-        self._ir = self._mmu.fetch(self._pc)
+        try:
+            self._ir = self._mmu.fetch(self._pc)
+        except PageFaultPending as pending:
+            log.logger.info("cpu - page {pageId} pending".format(pageId=pending.args[0]))
+            return False
         self._pc += 1
+        return True
 
     def _decode(self):
         ## decode no hace nada en este caso
@@ -290,9 +974,12 @@ class Cpu():
 ## emulates an Input/output device of the Hardware
 class AbstractIODevice():
 
-    def __init__(self, deviceId, deviceTime):
+    def __init__(self, deviceId, deviceTime, interruptVector, outInterruptionType=IO_OUT_INTERRUPTION_TYPE):
         self._deviceId = deviceId
+        self._interruptVector = interruptVector
         self._deviceTime = deviceTime
+        self._outInterruptionType = outInterruptionType
+        self._operationTime = deviceTime
         self._busy = False
 
     @property
@@ -315,22 +1002,47 @@ class AbstractIODevice():
             self._busy = True
             self._ticksCount = 0
             self._operation = operation
+            self._operationTime = self.operationTime(operation)
+
+    ## ticks que tarda la operacion (por default todas tardan deviceTime)
+    def operationTime(self, operation):
+        return self._deviceTime
 
     def tick(self, tickNbr):
         if (self._busy):
             self._ticksCount += 1
-            if (self._ticksCount > self._deviceTime):
+            if (self._ticksCount > self._operationTime):
                 ## operation execution has finished
                 self._busy = False
-                ioOutIRQ = IRQ(IO_OUT_INTERRUPTION_TYPE, self._deviceId)
-                HARDWARE.interruptVector.handle(ioOutIRQ)
+                ioOutIRQ = IRQ(self._outInterruptionType, self._deviceId)
+                self._interruptVector.handle(ioOutIRQ)
             else:
-                log.logger.info("device {deviceId} - Busy: {ticksCount} of {deviceTime}".format(deviceId = self.deviceId, ticksCount = self._ticksCount, deviceTime = self._deviceTime))
+                log.logger.info("device {deviceId} - Busy: {ticksCount} of {deviceTime}".format(deviceId = self.deviceId, ticksCount = self._ticksCount, deviceTime = self._operationTime))
+
+    ## ticks que faltan contar antes del tick en que termina la operacion
+    def quietTicks(self):
+        if self._busy:
+            return self._operationTime - self._ticksCount
+        return None
+
+    def advance(self, ticks):
+        if self._busy:
+            self._ticksCount += ticks
 
 
 class PrinterIODevice(AbstractIODevice):
-    def __init__(self):
-        super(PrinterIODevice, self).__init__("Printer", 3)
+    def __init__(self, interruptVector):
+        super(PrinterIODevice, self).__init__("Printer", 3, interruptVector)
+
+
+## backing store de las paginas: cada operacion transfiere operation['pages'] paginas
+## (la que se trae mas las sucias que se escriben de vuelta) y tarda latency ticks por pagina
+class SwapDevice(AbstractIODevice):
+    def __init__(self, latency, interruptVector):
+        super(SwapDevice, self).__init__("Swap", latency, interruptVector, PAGE_IN_INTERRUPTION_TYPE)
+
+    def operationTime(self, operation):
+        return self._deviceTime * operation['pages']
 
 
 class Timer:
@@ -341,9 +1053,10 @@ class Timer:
         self._tickCount = 0    # cantidad de de ciclos “ejecutados” por el proceso actual
         self._active = False    # por default esta desactivado
         self._quantum = 0   # por default esta desactivado
+        self._dispatchQuantum = 0   # quantum del proceso despachado ahora (por default el quantum)
 
     def tick(self, tickNbr):
-        if self._active and (self._tickCount >= self._quantum) and self._cpu.isBusy():
+        if self._active and (self._tickCount >= self._dispatchQuantum) and self._cpu.isBusy():
             # se “cumplio” el limite de ejecuciones
             timeoutIRQ = IRQ(TIMEOUT_INTERRUPTION_TYPE)
             self._interruptVector.handle(timeoutIRQ)
@@ -352,8 +1065,31 @@ class Timer:
         self._tickCount += 1
         self._cpu.tick(tickNbr)
 
-    def reset(self):
+    def quietTicks(self):
+        ticks = self._cpu.quietTicks()
+        if self._active and self._cpu.isBusy():
+            ## el timeout se dispara en el tick en que tickCount llega al quantum
+            untilTimeout = max(0, self._dispatchQuantum - self._tickCount)
+            if ticks is None or untilTimeout < ticks:
+                ticks = untilTimeout
+        return ticks
+
+    def advance(self, ticks):
+        self._tickCount += ticks
+        self._cpu.advance(ticks)
+
+    ## reinicia la cuenta; quantum permite darle un quantum propio solo a este dispatch
+    def reset(self, quantum=None):
            self._tickCount = 0
+           self._dispatchQuantum = self._quantum if quantum is None else quantum
+
+    @property
+    def active(self):
+        return self._active
+
+    @property
+    def dispatchQuantum(self):
+        return self._dispatchQuantum
 
     @property
     def quantum(self):
@@ -363,27 +1099,114 @@ class Timer:
     def quantum(self, quantum):
         self._active = True
         self._quantum = quantum
+        self._dispatchQuantum = quantum
+
+
+## emulates a processor core: its own CPU, MMU (with its TLB) and Timer
+## mientras un core hace su tick queda seleccionado en su maquina, asi hardware.cpu,
+## hardware.mmu y hardware.timer (y los handlers de las interrupciones que genera) son los suyos
+class Core():
+
+    def __init__(self, coreId, hardware, memory, interruptVector, clock, frameTable):
+        self._coreId = coreId
+        self._hardware = hardware
+        self._mmu = MMU(memory, interruptVector, clock, frameTable=frameTable)
+        self._cpu = Cpu(self._mmu, interruptVector)
+        self._timer = Timer(self._cpu, interruptVector)
+
+    def tick(self, tickNbr):
+        self._onThisCore(self._timer.tick, tickNbr)
+
+    def quietTicks(self):
+        return self._onThisCore(self._timer.quietTicks)
+
+    def advance(self, ticks):
+        self._onThisCore(self._timer.advance, ticks)
+
+    ## fuera del tick de un core queda seleccionado el que estaba (el core 0 por default)
+    def _onThisCore(self, action, *args):
+        hardware = self._hardware
+        previous = hardware.currentCore
+        hardware.selectCore(self._coreId)
+        try:
+            return action(*args)
+        finally:
+            hardware.selectCore(previous.coreId)
+
+    @property
+    def coreId(self):
+        return self._coreId
+
+    @property
+    def cpu(self):
+        return self._cpu
+
+    @property
+    def mmu(self):
+        return self._mmu
+
+    @property
+    def timer(self):
+        return self._timer
+
+    def __repr__(self):
+        return "Core {coreId}: {cpu}".format(coreId=self._coreId, cpu=self._cpu)
 
 
 ## emulates the Hardware that were the Operative System run
 class Hardware():
 
+    ## una maquina se puede crear ya configurada: Hardware(32, ticksPerSecond=None)
+    ## (sin parametros queda sin componentes hasta el setup, como el HARDWARE global)
+    def __init__(self, memorySize=None, ticksPerSecond=1, skipIdleTicks=False, cores=1, memoryFile=None, swapLatency=None):
+        if memorySize is not None:
+            self.setup(memorySize, ticksPerSecond, skipIdleTicks, cores, memoryFile, swapLatency)
+
     ## Setup our hardware
-    def setup(self, memorySize):
+    ## ticksPerSecond: velocidad del reloj, None para correr lo mas rapido posible (tiempo virtual)
+    ## skipIdleTicks: el reloj saltea los ticks en los que no puede pasar nada (modo por eventos)
+    ## cores: cantidad de cores (cada uno con su CPU, MMU y Timer; la memoria es compartida)
+    ## memoryFile: archivo donde mapear la memoria (mmap), para memorias mas grandes que el heap
+    ## swapLatency: ticks por pagina del dispositivo de swap; sin swap (None) los page faults no cuestan ticks
+    def setup(self, memorySize, ticksPerSecond=1, skipIdleTicks=False, cores=1, memoryFile=None, swapLatency=None):
         ## add the components to the "motherboard"
-        self._memory = Memory(memorySize)
+        self._memory = Memory(memorySize, backingFile=memoryFile)
         self._interruptVector = InterruptVector()
-        self._clock = Clock()
-        self._ioDevice = PrinterIODevice()
-        self._mmu = MMU(self._memory)
-        self._cpu = Cpu(self._mmu, self._interruptVector)
-        self._timer = Timer(self._cpu, self._interruptVector)
+        self._clock = Clock(ticksPerSecond, skipIdleTicks)
+        self._ioDevice = PrinterIODevice(self._interruptVector)
+        self._swapDevice = None if swapLatency is None else SwapDevice(swapLatency, self._interruptVector)
+        frameTable = FrameTable(self._memory, self._clock)
+        self._cores = [Core(coreId, self, self._memory, self._interruptVector, self._clock, frameTable) for coreId in range(cores)]
+        self._currentCore = self._cores[0]
         self._clock.addSubscriber(self._ioDevice)
-        self._clock.addSubscriber(self._timer)
+        if self._swapDevice is not None:
+            self._clock.addSubscriber(self._swapDevice)
+        for core in self._cores:
+            self._clock.addSubscriber(core)
+
+    def selectCore(self, coreId):
+        self._currentCore = self._cores[coreId]
 
-    def switchOn(self):
+    ## descarta la traduccion de la pagina en los TLB de todos los cores (TLB shootdown)
+    def invalidateTLBs(self, asid, pageId):
+        for core in self._cores:
+            core.mmu.invalidate(asid, pageId)
+
+    @property
+    def cores(self):
+        return self._cores
+
+    @property
+    def currentCore(self):
+        return self._currentCore
+
+    ## sin parametros prende la maquina en un thread que corre hasta el switchOff
+    ## con maxTicks y/o until corre de forma sincronica y devuelve los ticks ejecutados
+    def switchOn(self, maxTicks=None, until=None):
         log.logger.info(" ---- SWITCH ON ---- ")
-        return self.clock.start()
+        if maxTicks is None and until is None:
+            return self.clock.start()
+        return self.clock.run(maxTicks, until)
 
     def switchOff(self):
         self.clock.stop()
@@ -391,7 +1214,7 @@ class Hardware():
 
     @property
     def cpu(self):
-        return self._cpu
+        return self._currentCore.cpu
 
     @property
     def clock(self):
@@ -407,18 +1230,24 @@ class Hardware():
 
     @property
     def mmu(self):
-        return self._mmu
+        return self._currentCore.mmu
 
     @property
     def ioDevice(self):
         return self._ioDevice
 
+    @property
+    def swapDevice(self):
+        return self._swapDevice
+
     @property
     def timer(self):
-        return self._timer
+        return self._currentCore.timer
 
     def __repr__(self):
-        return "HARDWARE state {cpu}\n{mem}".format(cpu=self._cpu, mem=self._memory)
+        if len(self._cores) == 1:
+            return "HARDWARE state {cpu}\n{mem}".format(cpu=self.cpu, mem=self._memory)
+        return "HARDWARE state {cores}\n{mem}".format(cores=self._cores, mem=self._memory)
 
 ### HARDWARE is a global variable
 ### can be access from any
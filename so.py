@@ -1,9 +1,87 @@
 #!/usr/bin/env python
 
 from hardware import *
+from bisect import bisect_left, bisect_right
+from itertools import count
+from collections import OrderedDict, deque
+from functools import partial
+import copy
+import pickle
+import zlib
 import log
 
 
+## instrucciones de un programa codificadas por rachas: (instruccion, cantidad)
+## una direccion se resuelve con busqueda binaria sobre el offset de inicio de cada racha
+class RunLengthInstructions():
+
+    def __init__(self):
+        self._runs = []       # instruccion de cada racha
+        self._offsets = []    # direccion donde empieza cada racha
+        self._size = 0
+
+    def append(self, instruction, times=1):
+        if times <= 0:
+            return
+        if not (self._runs and self._runs[-1] == instruction):
+            self._runs.append(instruction)
+            self._offsets.append(self._size)
+        self._size += times
+
+    def extend(self, instructions):
+        if isinstance(instructions, InstructionRun):
+            self.append(instructions.instruction, instructions.times)
+        else:
+            for instruction in instructions:
+                self.append(instruction)
+
+    def runIndex(self, addr):
+        if addr < 0:
+            addr += self._size
+        if not (0 <= addr < self._size):
+            raise IndexError("Address {addr} out of program (size {size})".format(addr=addr, size=self._size))
+        return bisect_right(self._offsets, addr) - 1
+
+    ## cuantas instrucciones iguales quedan desde addr (inclusive) hasta el fin de su racha
+    def runLength(self, addr):
+        index = self.runIndex(addr)
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._size
+        return end - addr
+
+    ## recorre las instrucciones en [start, end) sin expandir todo el programa
+    def iterRange(self, start, end):
+        end = min(end, self._size)
+        if start >= end:
+            return
+        index = self.runIndex(start)
+        addr = start
+        while addr < end:
+            runEnd = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._size
+            for _ in range(addr, min(runEnd, end)):
+                yield self._runs[index]
+            addr = runEnd
+            index += 1
+
+    @property
+    def runs(self):
+        return [(instruction, self.runLength(offset)) for instruction, offset in zip(self._runs, self._offsets)]
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return self.iterRange(0, self._size)
+
+    def __getitem__(self, addr):
+        if isinstance(addr, slice):
+            start, end, step = addr.indices(self._size)
+            return list(self.iterRange(start, end))[::step]
+        return self._runs[self.runIndex(addr)]
+
+    def __repr__(self):
+        return "[{runs}]".format(runs=", ".join("{i} x {n}".format(i=i, n=n) for i, n in self.runs))
+
+
 
 ## emulates a compiled program
 class Program():
@@ -24,10 +102,10 @@ class Program():
         self._instructions.append(instruction)
 
     def expand(self, instructions):
-        expanded = []
+        expanded = RunLengthInstructions()
         for i in instructions:
-            if isinstance(i, list):
-                ## is a list of instructions
+            if isinstance(i, (list, InstructionRun)):
+                ## is a list (or a run) of instructions
                 expanded.extend(i)
             else:
                 ## a single instr (a String)
@@ -45,35 +123,176 @@ class Program():
         return "Program({name}, {instructions})".format(name=self._name, instructions=self._instructions)
 
 
+## cola FIFO con alta y baja en O(1) (sobre un deque)
+## la usan las ready queues de los schedulers y la cola de espera de los dispositivos
+class ProcessQueue():
+
+    def __init__(self):
+        self._queue = deque()
+
+    def add(self, element):
+        self._queue.append(element)
+
+    def pop(self):
+        #extrae (borra y devuelve) el primer elemento, None si esta vacia
+        if self._queue:
+            return self._queue.popleft()
+        return None
+
+    def first(self):
+        if self._queue:
+            return self._queue[0]
+        return None
+
+    def moveAllTo(self, other):
+        #pasa todos los elementos al final de la otra cola, respetando el orden
+        other._queue.extend(self._queue)
+        self._queue.clear()
+
+    def is_empty(self):
+        return not self._queue
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __iter__(self):
+        return iter(self._queue)
+
+    def __repr__(self):
+        return repr(list(self._queue))
+
+
+## heap binario (min-heap) de elementos con clave
+## guarda la posicion de cada elemento, asi cambiar su clave o sacarlo es O(log n)
+class IndexedHeap():
+
+    def __init__(self):
+        self._heap = []     # lista de [key, element]
+        self._index = {}    # element -> posicion en el heap
+
+    def push(self, element, key):
+        if element in self._index:
+            raise Exception("Element {element} is already in the heap".format(element=element))
+        self._heap.append([key, element])
+        self._index[element] = len(self._heap) - 1
+        self._siftUp(len(self._heap) - 1)
+
+    def pop(self):
+        #extrae el elemento de menor clave, None si esta vacio
+        if not self._heap:
+            return None
+        element = self._heap[0][1]
+        self.remove(element)
+        return element
+
+    def peek(self):
+        if not self._heap:
+            return None
+        return self._heap[0][1]
+
+    def key(self, element):
+        return self._heap[self._index[element]][0]
+
+    def updateKey(self, element, key):
+        position = self._index[element]
+        oldKey = self._heap[position][0]
+        self._heap[position][0] = key
+        if key < oldKey:
+            self._siftUp(position)
+        else:
+            self._siftDown(position)
+
+    def remove(self, element):
+        position = self._index.pop(element)
+        last = self._heap.pop()
+        if position < len(self._heap):
+            self._heap[position] = last
+            self._index[last[1]] = position
+            self._siftUp(position)
+            self._siftDown(self._index[last[1]])
+
+    def items(self):
+        #(key, element) ordenados por clave
+        return sorted(((key, element) for key, element in self._heap), key=lambda item: item[0])
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][1]] = i
+        self._index[heap[j][1]] = j
+
+    def _siftUp(self, position):
+        heap = self._heap
+        while position > 0:
+            parent = (position - 1) // 2
+            if heap[position][0] < heap[parent][0]:
+                self._swap(position, parent)
+                position = parent
+            else:
+                return
+
+    def _siftDown(self, position):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and heap[child][0] < heap[smallest][0]:
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
+
+    def __contains__(self, element):
+        return element in self._index
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return (element for _, element in self._heap)
+
+    def __repr__(self):
+        return repr([element for _, element in self.items()])
+
+
 ## emulates an Input/Output device controller (driver)
 class IoDeviceController():
 
     def __init__(self, device):
         self._device = device
-        self._waiting_queue = []
+        self._waiting_queue = ProcessQueue()
         self._currentPCB = None
+        self._currentInstruction = None
 
     def runOperation(self, pcb, instruction):
         pair = {'pcb': pcb, 'instruction': instruction}
-        # append: adds the element at the end of the queue
-        self._waiting_queue.append(pair)
+        # add: adds the element at the end of the queue
+        self._waiting_queue.add(pair)
         # try to send the instruction to hardware's device (if is idle)
         self.__load_from_waiting_queue_if_apply()
 
     def getFinishedPCB(self):
-        finishedPCB = self._currentPCB
+        return self.getFinished()[0]
+
+    ## el pcb y la instruccion de la operacion que termino
+    def getFinished(self):
+        finished = (self._currentPCB, self._currentInstruction)
         self._currentPCB = None
+        self._currentInstruction = None
         self.__load_from_waiting_queue_if_apply()
-        return finishedPCB
+        return finished
 
     def __load_from_waiting_queue_if_apply(self):
         if (len(self._waiting_queue) > 0) and self._device.is_idle:
             ## pop(): extracts (deletes and return) the first element in queue
-            pair = self._waiting_queue.pop(0)
+            pair = self._waiting_queue.pop()
             #print(pair)
             pcb = pair['pcb']
             instruction = pair['instruction']
             self._currentPCB = pcb
+            self._currentInstruction = instruction
             self._device.execute(instruction)
 
 
@@ -103,14 +322,20 @@ class NewInterruptionHandler(AbstractInterruptionHandler):
         pcb_pid = self.kernel.pcb_table.getNewPID()
         pageTable = self.kernel.loader.load(path)
         pcb = PCB(pcb_pid, pageTable, path, priority)
+        pcb.arrivalTick = self.kernel.hardware.clock.currentTick
         
         #Si hubiera mas scheduler expropiativos podriamos preguntar aca pero como solo hay uno prefiero que se encargue el scheduler
-        self.kernel.scheduler.manage(pcb)
+        admissionControl = self.kernel.admissionControl
+        if admissionControl is None or admissionControl.admit(pcb):
+            # las paginas del programa que ya estan en memoria se comparten desde el arranque
+            # (uno que espera afuera no retiene frames: las comparte en los page faults al volver)
+            self.kernel.memoryManager.mapShared(pcb)
+            self.kernel.scheduler.manage(pcb)
         self.kernel.pcb_table.add(pcb)
 
         
         log.logger.info("\n Executing program: {name}".format(name=path))
-        log.logger.info(HARDWARE)
+        log.logger.info(self.kernel.hardware)
 
 
 class KillInterruptionHandler(AbstractInterruptionHandler):
@@ -121,12 +346,15 @@ class KillInterruptionHandler(AbstractInterruptionHandler):
         pcb = self.kernel.runningPCB
         self.kernel.dispatcher.save(self.kernel.running_pcb) 
         self.kernel.running_pcb.state = "terminated"
+        pcb.finishTick = self.kernel.hardware.clock.currentTick
         
-        self.kernel.memoryManager.free(pcb.pageTable.values())
+        self.kernel.memoryManager.freeProcess(pcb.process_id)
+        self.kernel.swapSpace.discard(pcb.process_id)
+        self.kernel.scheduler.terminated(pcb)
         
         if (self.kernel.scheduler.is_empty()):
             self.kernel.running_pcb = None #Ponemos que no hay programa corriendo
-            HARDWARE.cpu.pc = -1## dejamos el CPU IDLE
+            self.kernel.hardware.cpu.pc = -1## dejamos el CPU IDLE
         else:
             pcb = self.kernel.scheduler.get_next()
             #Si ya esta cargado
@@ -139,6 +367,11 @@ class KillInterruptionHandler(AbstractInterruptionHandler):
                 pcb.pageTable = self.kernel.loader.load(pcb.path)
                 self.kernel.pcb_table.runningPCB = pcb
                 self.kernel.dispatcher.load(pcb)
+
+        #se liberaron frames: puede que entre algun proceso suspendido o que esperaba un frame
+        self.kernel.pageFaultHandler.wakeIfApply()
+        if self.kernel.admissionControl is not None:
+            self.kernel.admissionControl.resumeIfApply()
         
 
 class IoInInterruptionHandler(AbstractInterruptionHandler):
@@ -153,7 +386,7 @@ class IoInInterruptionHandler(AbstractInterruptionHandler):
         
         if (self.kernel.scheduler.is_empty()):
             self.kernel.running_pcb = None #Ponemos que no hay programa corriendo
-            HARDWARE.cpu.pc = -1## dejamos el CPU IDLE
+            self.kernel.hardware.cpu.pc = -1## dejamos el CPU IDLE
             
         else:
             next_pcb = self.kernel.scheduler.get_next()
@@ -161,7 +394,9 @@ class IoInInterruptionHandler(AbstractInterruptionHandler):
             next_pcb.process_state = "running"
             self.kernel.running_pcb = next_pcb
             
-        
+        self.kernel.pageFaultHandler.wakeIfApply()
+        if self.kernel.admissionControl is not None:
+            self.kernel.admissionControl.resumeIfApply()
         #
         log.logger.info(self.kernel.ioDeviceController)
 
@@ -172,11 +407,15 @@ class IoOutInterruptionHandler(AbstractInterruptionHandler):
     def execute(self, irq):
         pcb = self.kernel.ioDeviceController.getFinishedPCB()
         self.kernel.scheduler.manage(pcb)
+        self.kernel.pageFaultHandler.wakeIfApply()
+        if self.kernel.admissionControl is not None:
+            self.kernel.admissionControl.resumeIfApply()
         log.logger.info(self.kernel.ioDeviceController)
 
 class TimeOutInterruptionHandler(AbstractInterruptionHandler):
     def execute(self,irq):
         self.kernel.scheduler.update_ready_queue()
+        self.kernel.pageFaultHandler.wakeIfApply()
         
 class StatInterruptionHandler(AbstractInterruptionHandler):
     def __init__(self, kernel):
@@ -185,75 +424,257 @@ class StatInterruptionHandler(AbstractInterruptionHandler):
         
     def execute(self, irq):
         self.kernel.diagram.stateAct()  # Actualizar el estado de los procesos
-        if(HARDWARE.clock.currentTick == 30): #set en 28 asi hace el print antes de que finalize el ultimo programa, sino se apaga.
+        if(self.kernel.hardware.clock.currentTick == 30): #set en 28 asi hace el print antes de que finalize el ultimo programa, sino se apaga.
             self.kernel.diagram.print()
             
             
 class PageFaultIntHandler(AbstractInterruptionHandler):
+    def __init__(self, kernel):
+        super().__init__(kernel)
+        self._waitingFrame = ProcessQueue()   # procesos esperando que haya un frame para desalojar
+
     def execute(self, irq):
         
         pageId = irq.parameters
         pcb = self.kernel.pcb_table.runningPCB
-        
+        swapSpace = self.kernel.swapSpace
+        readAhead = self.kernel.memoryManager.readAhead
+        if readAhead is not None:
+            readAhead.update()
+
+        # si la pagina de codigo ya la cargo otro proceso del mismo programa se comparte el frame
+        sharedFrame = self.kernel.memoryManager.cachedFrame(pcb.path, pageId)
+        if sharedFrame is not None and not swapSpace.contains(pcb.process_id, pageId):
+            pcb.pageTable[pageId] = sharedFrame
+            self.kernel.memoryManager.share(sharedFrame, pcb, pageId)
+            self.kernel.hardware.mmu.setPageFrame(pageId, sharedFrame)
+            return
+
+        # con demasiados page faults en el sistema el proceso se suspende en vez de cargar la pagina
+        admissionControl = self.kernel.admissionControl
+        if admissionControl is not None and admissionControl.mustSuspend(pcb):
+            admissionControl.suspend(pcb)
+            self.wakeIfApply()
+            return
+
         allocFrame = self.kernel.memoryManager.alloc()
+        writeBacks = 0
          
         log.logger.info(f"Alojado en frame : {allocFrame}")
         if allocFrame is None:
-            victim = self.selectVictim()  # Selecciona una página para reemplazar
+            victim = self.selectVictim()  # Selecciona un frame para reemplazar
             log.logger.info(f"Seleccionando víctima: {victim}")
-            self.kernel.memoryManager.free([victim])
-            allocFrame = victim
-            
+            if victim is None:
+                # todos los frames estan viajando desde el swap o esperan que su proceso los use:
+                # el proceso espera un frame y el page fault se reintenta cuando vuelva a correr
+                self.waitForFrame(pcb)
+                return
+            writeBacks = self.evict(victim)
+            allocFrame = self.kernel.memoryManager.alloc()
+
+        # solo cuentan los page faults que cargan la pagina, una vez (no las esperas por un frame)
+        self.kernel.countPageFault()
+        shareable = self.readPage(pcb, pageId, allocFrame)
+        prefetched = self.prefetch(pcb, pageId) if readAhead is not None else []
+
+        if self.kernel.swapController is None:
+            # sin dispositivo de swap la pagina queda disponible en el momento
+            # Actualizar la tabla de páginas del PCB para reflejar el nuevo marco asignado
+            pcb.pageTable[pageId] = allocFrame
+            self.kernel.memoryManager.frameLoaded(allocFrame, pcb, pageId, shareable)
+            # Actualizar la TLB para indicar que ya a sido cargado
+            self.kernel.hardware.mmu.setPageFrame(pageId,allocFrame)
+            self.mapPrefetched(pcb, prefetched)
+        else:
+            # el proceso espera a que el swap traiga la pagina (y las adelantadas, y escriba las sucias que desalojo)
+            # el frame se mapea recien al terminar, asi no puede ser elegido como victima mientras tanto
+            pcb.process_state = "waiting"
+            self.kernel.dispatcher.save(pcb)
+            operation = {'pageId': pageId, 'frame': allocFrame, 'pages': 1 + writeBacks + len(prefetched),
+                         'shareable': shareable, 'prefetched': prefetched}
+            self.kernel.swapController.runOperation(pcb, operation)
+
+            if (self.kernel.scheduler.is_empty()):
+                self.kernel.running_pcb = None #Ponemos que no hay programa corriendo
+                self.kernel.hardware.cpu.pc = -1## dejamos el CPU IDLE
+            else:
+                next_pcb = self.kernel.scheduler.get_next()
+                self.kernel.dispatcher.load(next_pcb)
+                next_pcb.process_state = "running"
+                self.kernel.running_pcb = next_pcb
+        self.wakeIfApply()
         
-        self.kernel.loader.loadPage(pcb.path, pageId, allocFrame)
+    #copia la pagina al frame: si se habia escrito esta en el swap, si no se lee del programa
+    #devuelve si se puede compartir (es la pagina tal cual esta en el programa)
+    def readPage(self, pcb, pageId, frame):
+        swapSpace = self.kernel.swapSpace
+        if swapSpace.contains(pcb.process_id, pageId):
+            hardware = self.kernel.hardware
+            hardware.memory.writeCells(frame * hardware.mmu.frameSize, swapSpace.load(pcb.process_id, pageId))
+            return False
+        self.kernel.loader.loadPage(pcb.path, pageId, frame)
+        return True
+
+    #lectura anticipada: las paginas siguientes que ya estan en memoria se comparten y el resto
+    #se cargan en frames libres (nunca se desaloja para adelantar). Devuelve [(pageId, frame, shareable)]
+    #cargadas pero sin mapear todavia
+    def prefetch(self, pcb, pageId):
+        memoryManager = self.kernel.memoryManager
+        prefetched = []
+        for nextPage in memoryManager.readAhead.pages(pcb, pageId):
+            sharedFrame = memoryManager.cachedFrame(pcb.path, nextPage)
+            if sharedFrame is not None and not self.kernel.swapSpace.contains(pcb.process_id, nextPage):
+                pcb.pageTable[nextPage] = sharedFrame
+                memoryManager.share(sharedFrame, pcb, nextPage)
+                continue
+            frame = memoryManager.alloc()
+            if frame is None:
+                break
+            prefetched.append((nextPage, frame, self.readPage(pcb, nextPage, frame)))
+        return prefetched
+
+    def mapPrefetched(self, pcb, prefetched):
+        memoryManager = self.kernel.memoryManager
+        for pageId, frame, shareable in prefetched:
+            pcb.pageTable[pageId] = frame
+            memoryManager.frameLoaded(frame, pcb, pageId, shareable)
+            memoryManager.readAhead.prefetched(frame)
+
+    #saca de memoria todas las paginas del proceso (las sucias van al swap; las compartidas
+    #solo se desmapean)
+    def swapOut(self, pcb):
+        memoryManager = self.kernel.memoryManager
+        hardware = self.kernel.hardware
+        frames = []
+        for frame, pageId in memoryManager.framesOf(pcb.process_id):
+            if memoryManager.refCount(frame) > 1:
+                memoryManager.unmap(frame, pcb.process_id)
+            else:
+                if hardware.mmu.dirty[frame]:
+                    frameSize = hardware.mmu.frameSize
+                    self.kernel.swapSpace.store(pcb.process_id, pageId, hardware.memory.readCells(frame * frameSize, frameSize))
+                frames.append(frame)
+            pcb.pageTable[pageId] = None
+            hardware.invalidateTLBs(pcb.process_id, pageId)
+        memoryManager.free(frames)
+
+    #el proceso espera fuera de la ready queue: si volviera a listos le ganaria el CPU a los
+    #procesos que tienen que usar las paginas que acaban de llegar y nadie avanzaria
+    def waitForFrame(self, pcb):
+        self.kernel.dispatcher.save(pcb)
+        pcb.process_state = "waiting"
+        self._waitingFrame.add(pcb)
+        self.kernel.running_pcb = None
+        if not self.kernel.scheduler.is_empty():
+            next_pcb = self.kernel.scheduler.get_next()
+            self.kernel.dispatcher.load(next_pcb)
+            next_pcb.process_state = "running"
+            self.kernel.running_pcb = next_pcb
+
+    #los que esperaban un frame vuelven a listos si ya hay alguno para desalojar
+    def wakeIfApply(self):
+        if self._waitingFrame.is_empty() or not self.kernel.memoryManager.hasVictim():
+            return
+        waiting = ProcessQueue()
+        self._waitingFrame.moveAllTo(waiting)
+        for pcb in waiting:
+            self.kernel.scheduler.manage(pcb)
+
+    @property
+    def waitingFrame(self):
+        return self._waitingFrame
 
-        # Actualizar la tabla de páginas del PCB para reflejar el nuevo marco asignado
-        pcb.pageTable[pageId] = allocFrame
-        # Actualizar la TLB para indicar que ya a sido cargado
-        HARDWARE.mmu.setPageFrame(pageId,allocFrame)
-        
     def selectVictim(self):
-        #Agarro el primero que es el que fue ultimo usado 
-        victim = HARDWARE.mmu.access.pop(0)  # Pop de la cabeza para LRU
-        log.logger.info(f"Página víctima seleccionada: {victim}")
+        #La politica de reemplazo elegida al bootear decide que frame se libera
+        victim = self.kernel.memoryManager.selectVictim()
+        log.logger.info(f"Frame víctima seleccionado: {victim}")
         return victim
+
+    #devuelve cuantas paginas sucias se escribieron en el swap (las limpias se descartan)
+    def evict(self, frameId):
+        #El mapa inverso del memory manager dice que procesos tienen mapeado el frame y en que pagina
+        writeBacks = 0
+        hardware = self.kernel.hardware
+        dirty = hardware.mmu.dirty[frameId]
+        for pid, pageId in self.kernel.memoryManager.owners(frameId):
+            pcb = self.kernel.pcb_table.get(pid)
+            if dirty:
+                frameSize = hardware.mmu.frameSize
+                self.kernel.swapSpace.store(pid, pageId, hardware.memory.readCells(frameId * frameSize, frameSize))
+                writeBacks += 1
+            pcb.pageTable[pageId] = None
+            hardware.invalidateTLBs(pid, pageId)
+        self.kernel.memoryManager.free([frameId])
+        return writeBacks
+
+
+#el swap termino de traer la pagina: se mapea y el proceso vuelve a estar listo
+class PageInInterruptionHandler(AbstractInterruptionHandler):
+    def execute(self, irq):
+        pcb, operation = self.kernel.swapController.getFinished()
+        pcb.pageTable[operation['pageId']] = operation['frame']
+        self.kernel.memoryManager.frameLoaded(operation['frame'], pcb, operation['pageId'], operation['shareable'])
+        # hasta que el proceso vuelva a correr y la use, la pagina no puede ser victima
+        self.kernel.memoryManager.pin(operation['frame'])
+        self.kernel.pageFaultHandler.mapPrefetched(pcb, operation['prefetched'])
+        self.kernel.scheduler.manage(pcb)
+        self.kernel.pageFaultHandler.wakeIfApply()
+        #con cada page-in que termina puede haber bajado la frecuencia de page faults
+        if self.kernel.admissionControl is not None:
+            self.kernel.admissionControl.resumeIfApply()
+        log.logger.info(self.kernel.swapController)
         
 # emulates the core of an Operative System
 class Kernel():
 
-    def __init__(self):
+    ## replacementPolicy: politica de reemplazo de paginas (por default LRU)
+    ## hardware: maquina sobre la que bootea (por default el HARDWARE global tal como este configurado)
+    ## readAhead: lectura anticipada de paginas en los page faults (ReadAhead), por default no se adelanta
+    def __init__(self, replacementPolicy=None, hardware=None, readAhead=None):
+        if hardware is None:
+            hardware = HARDWARE
+        self._hardware = hardware
+        self._pageFaults = 0
+        self._admissionControl = None
 
         ## controls the Hardware's I/O Device
-        self._ioDeviceController = IoDeviceController(HARDWARE.ioDevice) 
-        self._pcb_table = PCB_Table()
+        self._ioDeviceController = IoDeviceController(self._hardware.ioDevice) 
+        ## el swap solo cuesta ticks si el hardware tiene dispositivo de swap
+        self._swapController = IoDeviceController(self._hardware.swapDevice) if self._hardware.swapDevice else None
+        self._swapSpace = SwapSpace()
+        self._pcb_table = PCB_Table(hardware)
         self._scheduler = None
-        self._memoryManager = MemoryManager()
-        self.dispatcher = Dispatcher()
+        self._memoryManager = MemoryManager(hardware, replacementPolicy, readAhead)
+        self.dispatcher = Dispatcher(hardware)
         self._diagram = GanttDiagram(self)
         self._fileSystem = FileSystem()
-        self._loader = Loader(self._fileSystem, self._memoryManager)
+        self._loader = Loader(self._fileSystem, self._memoryManager, hardware)
         
         ## setup interruption handlers
         newHandler = NewInterruptionHandler(self)
-        HARDWARE.interruptVector.register(NEW_INTERRUPTION_TYPE, newHandler)
+        self._hardware.interruptVector.register(NEW_INTERRUPTION_TYPE, newHandler)
         
         killHandler = KillInterruptionHandler(self)
-        HARDWARE.interruptVector.register(KILL_INTERRUPTION_TYPE, killHandler)
+        self._hardware.interruptVector.register(KILL_INTERRUPTION_TYPE, killHandler)
 
         ioInHandler = IoInInterruptionHandler(self)
-        HARDWARE.interruptVector.register(IO_IN_INTERRUPTION_TYPE, ioInHandler)
+        self._hardware.interruptVector.register(IO_IN_INTERRUPTION_TYPE, ioInHandler)
 
         ioOutHandler = IoOutInterruptionHandler(self)
-        HARDWARE.interruptVector.register(IO_OUT_INTERRUPTION_TYPE, ioOutHandler)
+        self._hardware.interruptVector.register(IO_OUT_INTERRUPTION_TYPE, ioOutHandler)
         
         timeoutHandler = TimeOutInterruptionHandler(self)
-        HARDWARE.interruptVector.register(TIMEOUT_INTERRUPTION_TYPE, timeoutHandler)
+        self._hardware.interruptVector.register(TIMEOUT_INTERRUPTION_TYPE, timeoutHandler)
         
         statHandler = StatInterruptionHandler(self)
-        HARDWARE.interruptVector.register(STAT_INTERRUPTION_TYPE, statHandler)
+        self._hardware.interruptVector.register(STAT_INTERRUPTION_TYPE, statHandler)
         
         pageHandler = PageFaultIntHandler(self)
-        HARDWARE.interruptVector.register(PAGE_FAULT_INTERRUPTION_TYPE, pageHandler)
+        self._hardware.interruptVector.register(PAGE_FAULT_INTERRUPTION_TYPE, pageHandler)
+        self._pageFaultHandler = pageHandler
+
+        pageInHandler = PageInInterruptionHandler(self)
+        self._hardware.interruptVector.register(PAGE_IN_INTERRUPTION_TYPE, pageInHandler)
 
     @property
     def scheduler(self):
@@ -267,7 +688,23 @@ class Kernel():
 
     @scheduler.setter
     def scheduler(self, scheduler_class):
+        if len(self._hardware.cores) > 1 and not isinstance(scheduler_class, MultiCoreScheduler):
+            #un solo scheduler para varios cores: una ready queue global
+            scheduler_class = MultiCoreScheduler(self, [scheduler_class])
         self._scheduler = scheduler_class
+
+    #una ready queue por core: schedulerFactory se llama una vez por core, con ese core
+    #seleccionado (asi cada scheduler configura el Timer de su core)
+    def useSchedulers(self, schedulerFactory):
+        schedulers = []
+        for core in self._hardware.cores:
+            self._hardware.selectCore(core.coreId)
+            schedulers.append(schedulerFactory())
+        self._hardware.selectCore(0)
+        if len(schedulers) == 1:
+            self.scheduler = schedulers[0]
+        else:
+            self.scheduler = MultiCoreScheduler(self, schedulers)
     
     @property
     def diagram(self): 
@@ -277,6 +714,18 @@ class Kernel():
     def ioDeviceController(self):
         return self._ioDeviceController
 
+    @property
+    def swapController(self):
+        return self._swapController
+
+    @property
+    def pageFaultHandler(self):
+        return self._pageFaultHandler
+
+    @property
+    def swapSpace(self):
+        return self._swapSpace
+
     @property
     def runningPCB(self):
         return self._pcb_table.runningPCB
@@ -298,32 +747,101 @@ class Kernel():
     def memoryManager(self):
         return self._memoryManager
 
+    @property
+    def replacementPolicy(self):
+        return self._memoryManager.replacementPolicy
+
+    @replacementPolicy.setter
+    def replacementPolicy(self, replacementPolicy):
+        self._memoryManager.replacementPolicy = replacementPolicy
+
 
     @runningPCB.setter
     def running_pcb(self, running_pcb):
         self.pcb_table.runningPCB = running_pcb
 
+    @property
+    def pageFaults(self):
+        return self._pageFaults
+
+    def countPageFault(self):
+        self._pageFaults += 1
+        if self._admissionControl is not None:
+            self._admissionControl.faultOccurred()
+
+    ## control de admision por frecuencia de page faults (PFFAdmissionControl), por default ninguno
+    @property
+    def admissionControl(self):
+        return self._admissionControl
+
+    @admissionControl.setter
+    def admissionControl(self, admissionControl):
+        self._admissionControl = admissionControl
+
+    #condicion de corte para hardware.switchOn(until=kernel.allTerminated)
+    def allTerminated(self):
+        return self._pcb_table.allTerminated()
+
     ## emulates a "system call" for programs execution
     def run(self, programPath, priority):
         
         parameters = {'path': programPath, 'priority': priority}
         newIRQ = IRQ(NEW_INTERRUPTION_TYPE, parameters) 
-        HARDWARE.interruptVector.handle(newIRQ)
+        self._hardware.interruptVector.handle(newIRQ)
         
         #Log
         log.logger.info("\n Executing program: {name}".format(name=programPath))
-        log.logger.info(HARDWARE)
+        log.logger.info(self._hardware)
         
+    ## agenda la llegada de un programa para el tick tickNbr
+    def runAt(self, tickNbr, programPath, priority):
+        self._hardware.clock.schedule(tickNbr, partial(self.run, programPath, priority))
+
+    ## guarda el estado completo (maquina + kernel) en un archivo binario comprimido
+    ## se toma con el reloj parado, por ejemplo entre dos kernel.hardware.switchOn(maxTicks=...)
+    def checkpoint(self, path):
+        with open(path, 'wb') as file:
+            file.write(zlib.compress(pickle.dumps(self, pickle.HIGHEST_PROTOCOL)))
+
+    ## levanta un checkpoint: devuelve su kernel, que trae su propia maquina (kernel.hardware)
+    @staticmethod
+    def restore(path):
+        with open(path, 'rb') as file:
+            return pickle.loads(zlib.decompress(file.read()))
+
+    ## clona la simulacion en el tick actual: devuelve un kernel con su propia maquina (clon.hardware).
+    ## La memoria se comparte copy-on-write y las imagenes de los programas no se copian (no cambian)
+    def fork(self):
+        memo = {id(program): program for program in self._fileSystem.programs()}
+        return copy.deepcopy(self, memo)
+
+    @property
+    def hardware(self):
+        return self._hardware
+
     def __repr__(self):
         return "Kernel "
 
 class Loader():
     #carga el programa en la memoria y y devuelve la pageTable
+    #las paginas de los programas se guardan ya codificadas (una por (path, frameSize, pageId))
+    #en un cache LRU de hasta imageCacheCells celdas: un page fault es copiar un chunk a memoria
 
-    def __init__(self,fileSystem,memoryManager):
+    def __init__(self, fileSystem, memoryManager, hardware, imageCacheCells=1 << 20):
         self._fileSystem = fileSystem
         self._memoryManager = memoryManager   
-        self.frameSize = HARDWARE.mmu.frameSize 
+        self._hardware = hardware
+        self._imageCache = OrderedDict()    # (path, frameSize, pageId) -> (programa, chunk)
+        self._imageCacheCells = imageCacheCells
+        self._cachedCells = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    #se lee siempre del MMU: el tamanio de frame se puede configurar despues de bootear
+    @property
+    def frameSize(self):
+        return self._hardware.mmu.frameSize
                
     def load(self, path):
 
@@ -340,37 +858,84 @@ class Loader():
         return allocFrames    
     
     def loadPage(self,pcb,pageToLoad,freeFrame):
-        prg = self._fileSystem.read(pcb)
-
-        start = pageToLoad * self.frameSize
-        end = start + self.frameSize
-        
-        for i in range(start, min(end, len(prg.instructions))):
-            inst = prg.instructions[i]
-            memoryAddress = (freeFrame * self.frameSize) + (i % self.frameSize)  # Calcular la dirección física
-            HARDWARE.memory.write(memoryAddress, inst)
+        frameSize = self.frameSize
+        self._hardware.memory.writeOpcodes(freeFrame * frameSize, self.pageImage(pcb, pageToLoad, frameSize))
          
-        log.logger.info(HARDWARE)
-           
-        
+        log.logger.info(self._hardware)
+
+    #la pagina del programa codificada; si no esta en el cache se arma recorriendo
+    #solo las rachas que caen dentro de la pagina
+    def pageImage(self, path, pageId, frameSize):
+        prg = self._fileSystem.read(path)
+        key = (path, frameSize, pageId)
+        cached = self._imageCache.get(key)
+        # si se reescribio el programa en el file system la copia del cache no sirve
+        if cached is not None and cached[0] is prg:
+            self._hits += 1
+            self._imageCache.move_to_end(key)
+            return cached[1]
+
+        self._misses += 1
+        start = pageId * frameSize
+        chunk = bytes(opcodeOf(inst) for inst in prg.instructions.iterRange(start, start + frameSize))
+        if cached is not None:
+            self._cachedCells -= len(cached[1])
+        self._imageCache[key] = (prg, chunk)
+        self._imageCache.move_to_end(key)
+        self._cachedCells += len(chunk)
+        while self._cachedCells > self._imageCacheCells and len(self._imageCache) > 1:
+            _, (_, evicted) = self._imageCache.popitem(last=False)
+            self._cachedCells -= len(evicted)
+            self._evictions += 1
+        return chunk
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
 
+    @property
+    def cachedCells(self):
+        return self._cachedCells
+
+    #el cache no viaja en checkpoints ni forks (los opcodes dependen del proceso)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_imageCache'] = OrderedDict()
+        state['_cachedCells'] = 0
+        return state
+
+    def __repr__(self):
+        return "Loader image cache: {cells} cells hits: {hits} misses: {misses} evictions: {evictions}".format(
+            cells=self._cachedCells, hits=self._hits, misses=self._misses, evictions=self._evictions)
+        
 
 class Dispatcher():
     #busca la baseDir del proceso en la pcbtable y la carga en la mmu
     #pone un proceso en running(setea pc y le dice a la mmu la baseDir)
     #saca un proceso de running(toma el pc de la cpu y setea el pc en -1)
     #algo asi:
+
+    def __init__(self, hardware):
+        self._hardware = hardware
     
     def load(self, pcb):
-        HARDWARE.cpu.pc = pcb.pc 
-        HARDWARE.mmu.resetTLB()
-
-        for pageIndex, frameIndex in pcb.pageTable.items():
-            HARDWARE.mmu.setPageFrame(pageIndex, frameIndex)
+        self._hardware.cpu.pc = pcb.pc 
+        #el TLB esta etiquetado por asid: no hace falta vaciarlo ni recargarlo
+        self._hardware.mmu.switchAddressSpace(pcb.process_id, pcb.pageTable)
+        #el limite es el del proceso: hasta la ultima celda de su ultima pagina
+        self._hardware.mmu.limit = len(pcb.pageTable) * self._hardware.mmu.frameSize - 1
 
     def save(self, pcb): 
-        pcb.pc = HARDWARE.cpu.pc
-        HARDWARE.cpu.pc = -1 #queda idle hasta el proximo load 
+        pcb.pc = self._hardware.cpu.pc
+        self._hardware.cpu.pc = -1 #queda idle hasta el proximo load 
     
 
 class PCB():
@@ -381,6 +946,8 @@ class PCB():
         self.process_state = "new"  # Estado del proceso (new, ready, running, waiting, terminated)
         self.path = prg_name # Path del programa asociado al proceso
         self.priority = priority
+        self.arrivalTick = None # tick en que llego el programa
+        self.finishTick = None # tick en que termino
 
     @property   
     def program_counter(self):
@@ -417,43 +984,56 @@ class PCB():
 
 
 class PCB_Table():
-    def __init__(self):
+    def __init__(self, hardware):
+        self._hardware = hardware
         self._pcb_table = []
+        self._pcbsByPid = dict()
         self._nextPID= 0
-        self._running_pcb = None
+        #un pcb corriendo por core
+        self._running_pcbs = [None] * len(self._hardware.cores)
     
     @property 
     def table(self):
         return self._pcb_table
     
     def get(self, pid):
-        return next((pcb for pcb in self._pcb_table if pcb.process_id == pid), None) 
+        return self._pcbsByPid.get(pid)
             
     def add(self, pcb):
         self._pcb_table.append(pcb)  
+        self._pcbsByPid[pcb.process_id] = pcb
     
+    def allTerminated(self):
+        return all(pcb.state == "terminated" for pcb in self._pcb_table)
+
     def getNewPID(self):
         pid = self._nextPID
         self._nextPID += 1
         return pid 
 
+    #el pcb que corre en el core seleccionado
     @property   
     def runningPCB(self):
-        return self._running_pcb 
+        return self._running_pcbs[self._hardware.currentCore.coreId]
 
     @runningPCB.setter
     def runningPCB(self, running_pcb):
-        self._running_pcb = running_pcb
+        self._running_pcbs[self._hardware.currentCore.coreId] = running_pcb
+
+    @property
+    def runningPCBs(self):
+        return self._running_pcbs
 
     def remove(self, pid): 
         self._pcb_table.remove(pid)
+        self._pcbsByPid.pop(pid.process_id, None)
 
     
 #Schedulers
 
 class Scheduler():
     def __init__(self, kernel):
-        self._ready_queue = []
+        self._ready_queue = ProcessQueue()
         self.kernel = kernel
         
     def manage(self,pcb):         
@@ -466,13 +1046,17 @@ class Scheduler():
             self.kernel.running_pcb = pcb
         
     def add(self, pcb):
-        self._ready_queue.append(pcb)
+        self._ready_queue.add(pcb)
     
     def is_empty(self):
         return len(self._ready_queue) == 0
         
     def size(self): 
         return len(self._ready_queue) 
+
+    #el pcb termino: el scheduler olvida lo que sabia de el
+    def terminated(self, pcb):
+        pass
     
     def __repr__(self):
         return (f"Scheduler(size:{self.size}, queue={[pcb.process_id for pcb in self._ready_queue]}) ")
@@ -480,60 +1064,158 @@ class Scheduler():
     def get_next(self):
         # Devuelve el primer proceso en la cola
         if not self.is_empty():
-            process = self._ready_queue.pop(0)
+            process = self._ready_queue.pop()
             return process
         return None
 
 
+class MultiCoreScheduler():
+    #reparte los procesos entre los cores. Con un solo scheduler la ready queue es global;
+    #con uno por core cada core despacha de su propia ready queue, los procesos que llegan van a un
+    #core libre (o al de cola mas corta) y el core que se queda sin trabajo le roba al mas cargado
+    def __init__(self, kernel, schedulers):
+        self.kernel = kernel
+        self._schedulers = schedulers
+        self._steals = 0
+        if len(schedulers) == 1:
+            #el scheduler compartido configuro solo el Timer del core actual
+            timer = self.kernel.hardware.timer
+            for core in self.kernel.hardware.cores:
+                if timer.active and core.timer is not timer:
+                    core.timer.quantum = timer.quantum
+
+    def local(self):
+        #el scheduler del core seleccionado
+        if len(self._schedulers) == 1:
+            return self._schedulers[0]
+        return self._schedulers[self.kernel.hardware.currentCore.coreId]
+
+    def manage(self, pcb):
+        running = self.kernel.pcb_table.runningPCBs
+        current = self.kernel.hardware.currentCore.coreId
+        target = current
+        if running[current] is not None:
+            idle = [coreId for coreId, running_pcb in enumerate(running) if running_pcb is None]
+            if idle:
+                target = idle[0]
+            elif len(self._schedulers) > 1:
+                target = min(range(len(self._schedulers)), key=lambda coreId: self._schedulers[coreId].size())
+        self.kernel.hardware.selectCore(target)
+        try:
+            self.local().manage(pcb)
+        finally:
+            self.kernel.hardware.selectCore(current)
+
+    def add(self, pcb):
+        self.local().add(pcb)
+
+    def first(self):
+        return self.local().first()
+
+    def get_next(self):
+        pcb = self.local().get_next()
+        if pcb is None and len(self._schedulers) > 1:
+            busiest = max(self._schedulers, key=lambda scheduler: scheduler.size())
+            if not busiest.is_empty():
+                pcb = busiest.get_next()
+                self._steals += 1
+                log.logger.info("core {coreId} steals PCB {pid}".format(coreId=self.kernel.hardware.currentCore.coreId, pid=pcb.process_id))
+        return pcb
+
+    def update_ready_queue(self):
+        self.local().update_ready_queue()
+
+    def terminated(self, pcb):
+        #pudo haber pasado por la ready queue de cualquier core (robo de trabajo)
+        for scheduler in self._schedulers:
+            scheduler.terminated(pcb)
+
+    def is_empty(self):
+        #un core solo se queda sin trabajo si no tiene a quien robarle
+        return all(scheduler.is_empty() for scheduler in self._schedulers)
+
+    def size(self):
+        return sum(scheduler.size() for scheduler in self._schedulers)
+
+    @property
+    def schedulers(self):
+        return self._schedulers
+
+    @property
+    def steals(self):
+        return self._steals
+
+    def __repr__(self):
+        return "MultiCoreScheduler({schedulers}, steals={steals})".format(schedulers=self._schedulers, steals=self._steals)
+
+
 class SchedulerFCFS(Scheduler):
     def size(self): 
         return len(self._ready_queue) 
     
     
-class SchedulerPriorityNonPreemptive(Scheduler):
-    
-    def __init__(self,kernel):
+class SchedulerPriority(Scheduler):
+    #ready queue en un heap indexado por prioridad y orden de llegada:
+    #admite cualquier prioridad entera (menor numero = mas prioridad), add y get_next son O(log n)
+    #y dentro de una misma prioridad se respeta FIFO.
+    #
+    #Aging "lazy": cada dispatch es una epoca y los procesos que esperan suben agingRate niveles
+    #por epoca, hasta el 0. No se mueve ningun PCB: un proceso de prioridad p encolado en la epoca e
+    #llega al nivel 0 en la epoca p + agingRate * e, y ordenar por ese valor da el mismo orden que
+    #bajar todos los procesos un nivel en cada dispatch (las prioridades negativas no envejecen)
+
+    def __init__(self, kernel, agingRate=1):
         super().__init__(kernel)
-        self._ready_queue = {0: [], 1: [], 2: [], 3: [], 4: []}
+        self._ready_queue = IndexedHeap()
+        self._arrivals = count()
+        self._agingRate = agingRate
+        self._epoch = 0
         
         
     def add(self, pcb):
-        if (0 <= pcb.priority <= 4):
-            self._ready_queue.get(pcb.priority).append(pcb)
-        else:
-            None
+        self._ready_queue.push(pcb, self._key(pcb.priority, self._epoch))
+
+    def _key(self, priority, epoch):
+        if priority < 0:
+            return (priority, next(self._arrivals))
+        return (0, priority + self._agingRate * epoch, next(self._arrivals))
+
+    def effective_priority(self, pcb):
+        #nivel en el que esta hoy el pcb encolado, despues del aging
+        key = self._ready_queue.key(pcb)
+        if key[0] < 0:
+            return key[0]
+        return max(0, key[1] - self._agingRate * self._epoch)
+
+    @property
+    def agingRate(self):
+        return self._agingRate
 
     def first(self):
         #Devuelve el primer proceso en la cola sin removerlo
-        for priority in range (0, 5):
-            if self._ready_queue[priority]:
-                return self._ready_queue[priority][0]
-        return None
+        return self._ready_queue.peek()
     
 
     def get_next(self):
         #Devuelve el primer proceso en la cola de prioridad mas alta y lo elimina de esta
-        for priority in range(0,5):
-            if self._ready_queue[priority]:
-                next_pcb = self._ready_queue[priority].pop(0)
-                self.apply_aging() #aplicamos aging luego de cada extraccion de pcb
-                return next_pcb
-        return None 
+        next_pcb = self._ready_queue.pop()
+        if next_pcb is not None:
+            self.apply_aging() #aplicamos aging luego de cada extraccion de pcb
+        return next_pcb
     
     def apply_aging(self):
-        #incrementa la prioridad de cada proceso (Se baja su posicion en la lista)
-        for priority in range(1, 5):
-            while self._ready_queue[priority]:
-                self._ready_queue[priority - 1].append(self._ready_queue[priority].pop(0))
+        #incrementa la prioridad de todos los procesos que esperan: basta con pasar a la proxima epoca
+        self._epoch += 1
                 
     def is_empty(self):
-        return all(not self._ready_queue[priority] for priority in range(5))
+        return len(self._ready_queue) == 0
 
-class SchedulerPriorityPreemptive(Scheduler):
-    def __init__(self,kernel):
-        super().__init__(kernel)
-        self._ready_queue = {0: [], 1: [], 2: [], 3: [], 4: []}
-        
+
+class SchedulerPriorityNonPreemptive(SchedulerPriority):
+    pass
+
+
+class SchedulerPriorityPreemptive(SchedulerPriority):
         
     def manage(self,pcb):
         if(self.kernel.runningPCB):            
@@ -547,14 +1229,6 @@ class SchedulerPriorityPreemptive(Scheduler):
             self.kernel.dispatcher.load(pcb)
             self.kernel.running_pcb = pcb 
 
-    
-        
-    def add(self, pcb):
-        if (0 <= pcb.priority <= 4):
-            self._ready_queue.get(pcb.priority).append(pcb)
-        else:
-            None
-            
  
     def mustExpropiate(self, runningPcb, pcbToAdd):
         return pcbToAdd.priority < runningPcb.priority 
@@ -568,51 +1242,23 @@ class SchedulerPriorityPreemptive(Scheduler):
         pcbToAdd.process_state = "running"
         self.kernel.dispatcher.load(pcbToAdd)
         self.kernel.running_pcb = pcbToAdd
-    
-    def first(self):
-        #Devuelve el primer proceso en la cola sin removerlo
-        for priority in range (0, 5):
-            if self._ready_queue[priority]:
-                return self._ready_queue[priority][0]
-        return None
-    
-    def get_next(self):
-        #Devuelve el primer proceso en la cola de prioridad mas alta y lo elimina de esta
-        for priority in range(0,5):
-            if self._ready_queue[priority]:
-                next_pcb = self._ready_queue[priority].pop(0)
-                self.apply_aging() #aplicamos aging luego de cada extraccion de pcb
-                return next_pcb
-        return None 
-    
-    def apply_aging(self):
-        #incrementa la prioridad de cada proceso (Se baja su posicion en la lista)
-        for priority in range(1, 5):
-            while self._ready_queue[priority]:
-                self._ready_queue[priority - 1].append(self._ready_queue[priority].pop(0))
-                
-    def is_empty(self):
-        for priority in range(5):
-            if (self._ready_queue[priority]):
-                return False
-        return True  
 
     
 class SchedulerRoundRobin(Scheduler):
     def __init__(self, quantum, kernel):
         super().__init__(kernel)
-        HARDWARE.timer.quantum = quantum
-        HARDWARE.timer.reset() 
+        self.kernel.hardware.timer.quantum = quantum
+        self.kernel.hardware.timer.reset() 
     
     def update_ready_queue(self):
         # Proceso actual
         current_process = self.kernel.running_pcb
-        HARDWARE.timer.reset() 
+        self.kernel.hardware.timer.reset() 
         # Solo si hay un proceso en ejecución y no es None
         if current_process:
             self.kernel.dispatcher.save(current_process)
             current_process.process_state = 'ready'
-            self._ready_queue.append(current_process)  # Añadimos el proceso al final de la cola
+            self._ready_queue.add(current_process)  # Añadimos el proceso al final de la cola
 
         # Tomar el siguiente proceso en la ready queue respetando FIFO
         next_process = self.get_next()
@@ -620,32 +1266,844 @@ class SchedulerRoundRobin(Scheduler):
             next_process.process_state = 'running'
             self.kernel.dispatcher.load(next_process)
             self.kernel.running_pcb = next_process
+
+
+class SchedulerMLFQ(Scheduler):
+    #Multilevel feedback queue: una cola FIFO por nivel, el nivel 0 es el de mas prioridad.
+    #Cada nivel tiene su quantum (el Timer lo recibe en cada dispatch). Un proceso que agota su quantum
+    #baja un nivel (los CPU-bound terminan en los de quantum largo); uno que deja el CPU antes por IO
+    #conserva su nivel. Un proceso que llega a un nivel mas alto que el que corre lo expropia.
+    #Cada boostInterval ticks todos vuelven al nivel 0 para que nadie muera de inanicion.
+    def __init__(self, kernel, quantums=(2, 4, 8), boostInterval=50):
+        super().__init__(kernel)
+        self._quantums = list(quantums)
+        self._ready_queue = [ProcessQueue() for _ in self._quantums]
+        self._levels = dict()  # pcb -> nivel
+        self._boostInterval = boostInterval
+        self._lastBoost = 0
+        self.kernel.hardware.timer.quantum = self._quantums[0]
+        self.kernel.hardware.timer.reset()
+
+    def level(self, pcb):
+        return self._levels.get(pcb, 0)
+
+    def manage(self, pcb):
+        running_pcb = self.kernel.runningPCB
+        if running_pcb and self.level(pcb) < self.level(running_pcb):
+            running_pcb.process_state = 'ready'
+            self.kernel.dispatcher.save(running_pcb)
+            self.add(running_pcb)
+            self.dispatch(pcb)
+        elif running_pcb:
+            pcb.process_state = "ready"
+            self.add(pcb)
+        else:
+            self.dispatch(pcb)
+
+    def dispatch(self, pcb):
+        pcb.process_state = "running"
+        self.kernel.dispatcher.load(pcb)
+        self.kernel.running_pcb = pcb
+        self.kernel.hardware.timer.reset(self._quantums[self.level(pcb)])
+
+    def add(self, pcb):
+        self._ready_queue[self.level(pcb)].add(pcb)
+
+    def first(self):
+        for queue in self._ready_queue:
+            if not queue.is_empty():
+                return queue.first()
+        return None
+
+    def get_next(self):
+        #los handlers despachan el pcb que devolvemos: le dejamos armado el quantum de su nivel
+        self.boost_if_apply()
+        for queue in self._ready_queue:
+            if not queue.is_empty():
+                next_pcb = queue.pop()
+                self.kernel.hardware.timer.reset(self._quantums[self.level(next_pcb)])
+                return next_pcb
+        return None
+
+    def update_ready_queue(self):
+        #timeout: el proceso uso todo su quantum, baja un nivel
+        current_process = self.kernel.running_pcb
+        if current_process:
+            self.kernel.dispatcher.save(current_process)
+            current_process.process_state = 'ready'
+            self._levels[current_process] = min(self.level(current_process) + 1, len(self._quantums) - 1)
+            self.add(current_process)
+
+        next_process = self.get_next()
+        if next_process:
+            self.dispatch(next_process)
+        else:
+            self.kernel.hardware.timer.reset()
+
+    def terminated(self, pcb):
+        self._levels.pop(pcb, None)
+
+    def boost_if_apply(self):
+        if self.kernel.hardware.clock.currentTick - self._lastBoost < self._boostInterval:
+            return
+        self._lastBoost = self.kernel.hardware.clock.currentTick
+        for queue in self._ready_queue[1:]:
+            queue.moveAllTo(self._ready_queue[0])
+        self._levels.clear()
+
+    def is_empty(self):
+        return all(queue.is_empty() for queue in self._ready_queue)
+
+    def size(self):
+        return sum(len(queue) for queue in self._ready_queue)
+
+
+class BurstEstimator():
+    #estima cuantos ticks le quedan a la rafaga de CPU actual de un pcb.
+    #Con la imagen del programa la cuenta es exacta: la racha de instrucciones CPU desde el pc
+    #mas la instruccion (IO/EXIT) que la corta. Si no hay imagen (o useProgramImage=False) se usa
+    #el promedio exponencial de las rafagas medidas: tau = alpha * rafaga + (1 - alpha) * tau
+    def __init__(self, kernel, alpha=0.5, initialEstimate=5, useProgramImage=True):
+        self.kernel = kernel
+        self._alpha = alpha
+        self._initialEstimate = initialEstimate
+        self._useProgramImage = useProgramImage
+        self._tau = dict()        # pcb -> rafaga estimada
+        self._startPc = dict()    # pcb -> pc con el que se despacho
+        self._ran = dict()        # pcb -> ticks ya corridos de la rafaga actual
+
+    def estimate(self, pcb, pc=None):
+        if pc is None:
+            pc = pcb.pc
+        if self._useProgramImage:
+            remaining = self._fromProgramImage(pcb, pc)
+            if remaining is not None:
+                return remaining
+        ran = self._ran.get(pcb, 0)
+        if pcb in self._startPc:
+            ran += pc - self._startPc[pcb]
+        return max(1, self._tau.get(pcb, self._initialEstimate) - ran)
+
+    def _fromProgramImage(self, pcb, pc):
+        try:
+            instructions = self.kernel.fileSystem.read(pcb.path).instructions
+            if instructions[pc] == INSTRUCTION_CPU:
+                return instructions.runLength(pc) + 1
+            return 1
+        except (KeyError, IndexError, AttributeError):
+            return None
+
+    def dispatched(self, pcb):
+        self._startPc[pcb] = pcb.pc
+
+    #el pcb dejo el CPU: completed=False si fue expropiado (la rafaga sigue)
+    def stopped(self, pcb, completed=True):
+        if pcb not in self._startPc:
+            return
+        ran = self._ran.pop(pcb, 0) + pcb.pc - self._startPc.pop(pcb)
+        if completed:
+            tau = self._tau.get(pcb, self._initialEstimate)
+            self._tau[pcb] = self._alpha * ran + (1 - self._alpha) * tau
+        else:
+            self._ran[pcb] = ran
+
+    #el pcb termino: no hace falta seguir su rafaga
+    def forget(self, pcb):
+        self._tau.pop(pcb, None)
+        self._startPc.pop(pcb, None)
+        self._ran.pop(pcb, None)
+
+
+class SchedulerSJF(Scheduler):
+    #Shortest job first (no expropiativo): despacha el pcb con la rafaga de CPU estimada mas corta.
+    #Ready queue en un heap indexado por (estimacion, orden de llegada)
+    def __init__(self, kernel, estimator=None):
+        super().__init__(kernel)
+        self._ready_queue = IndexedHeap()
+        self._arrivals = count()
+        self._estimator = estimator if estimator else BurstEstimator(kernel)
+
+    @property
+    def estimator(self):
+        return self._estimator
+
+    def manage(self, pcb):
+        self._estimator.stopped(pcb)
+        if self.kernel.runningPCB:
+            pcb.process_state = "ready"
+            self.add(pcb)
+        else:
+            self.dispatch(pcb)
+
+    def dispatch(self, pcb):
+        pcb.process_state = "running"
+        self._estimator.dispatched(pcb)
+        self.kernel.dispatcher.load(pcb)
+        self.kernel.running_pcb = pcb
+
+    def add(self, pcb):
+        self._ready_queue.push(pcb, (self._estimator.estimate(pcb), next(self._arrivals)))
+
+    def first(self):
+        return self._ready_queue.peek()
+
+    def get_next(self):
+        next_pcb = self._ready_queue.pop()
+        if next_pcb is not None:
+            self._estimator.dispatched(next_pcb)
+        return next_pcb
+
+    def terminated(self, pcb):
+        self._estimator.forget(pcb)
+
+    def is_empty(self):
+        return len(self._ready_queue) == 0
+
+
+class SchedulerSRTF(SchedulerSJF):
+    #Shortest remaining time first: al llegar un pcb (nuevo o de vuelta de IO) expropia
+    #al que corre si su rafaga estimada es menor a lo que le queda al que esta corriendo
+    def manage(self, pcb):
+        self._estimator.stopped(pcb)
+        running_pcb = self.kernel.runningPCB
+        if running_pcb and self.mustExpropiate(running_pcb, pcb):
+            running_pcb.process_state = 'ready'
+            self.kernel.dispatcher.save(running_pcb)
+            self._estimator.stopped(running_pcb, completed=False)
+            self.add(running_pcb)
+            self.dispatch(pcb)
+        elif running_pcb:
+            pcb.process_state = "ready"
+            self.add(pcb)
+        else:
+            self.dispatch(pcb)
+
+    def mustExpropiate(self, runningPcb, pcbToAdd):
+        remaining = self._estimator.estimate(runningPcb, self.kernel.hardware.cpu.pc)
+        return self._estimator.estimate(pcbToAdd) < remaining
+
+
+class SchedulerCFS(Scheduler):
+    #Fair share (estilo CFS): cada pcb acumula un "virtual runtime" = ticks corridos * 1024 / peso,
+    #con el peso sacado de su prioridad (cada nivel de prioridad pesa 1.25 veces mas que el siguiente).
+    #Siempre se despacha el de menor vruntime (heap indexado, O(log n) por cambio de contexto) y el
+    #Timer le da una tajada de targetLatency proporcional a su peso, nunca menor a minGranularity.
+    #Como el nice de Linux las prioridades van de -20 a 19: las de afuera pesan como la del borde
+    #(sin tope 1.25 ** priority se desborda o el peso da 0)
+    MIN_PRIORITY = -20
+    MAX_PRIORITY = 19
+    WEIGHTS = [1024 / (1.25 ** priority) for priority in range(MIN_PRIORITY, MAX_PRIORITY + 1)]
+
+    def __init__(self, kernel, targetLatency=12, minGranularity=2):
+        super().__init__(kernel)
+        self._ready_queue = IndexedHeap()
+        self._arrivals = count()
+        self._targetLatency = targetLatency
+        self._minGranularity = minGranularity
+        self._vruntime = dict()   # pcb -> virtual runtime
+        self._startPc = dict()    # pcb -> pc con el que se despacho
+        self._minVruntime = 0
+        self._totalWeight = 0     # peso de los pcbs en la ready queue
+        self.kernel.hardware.timer.quantum = targetLatency
+        self.kernel.hardware.timer.reset()
+
+    def weight(self, pcb):
+        priority = min(max(pcb.priority, SchedulerCFS.MIN_PRIORITY), SchedulerCFS.MAX_PRIORITY)
+        return SchedulerCFS.WEIGHTS[priority - SchedulerCFS.MIN_PRIORITY]
+
+    def vruntime(self, pcb):
+        return self._vruntime.get(pcb, 0)
+
+    def timeslice(self, pcb):
+        #la tajada se reparte entre el pcb a despachar y los que quedan esperando
+        share = self.weight(pcb) / (self._totalWeight + self.weight(pcb))
+        return max(self._minGranularity, round(self._targetLatency * share))
+
+    def _account(self, pcb):
+        #suma al vruntime lo que el pcb corrio desde que se despacho
+        if pcb not in self._startPc:
+            return
+        ran = pcb.pc - self._startPc.pop(pcb)
+        self._vruntime[pcb] = self.vruntime(pcb) + ran * 1024 / self.weight(pcb)
+
+    def manage(self, pcb):
+        self._account(pcb)
+        #un pcb nuevo o que vuelve de IO no arranca con ventaja de mas sobre los que estan listos
+        self._vruntime[pcb] = max(self.vruntime(pcb), self._minVruntime - self._targetLatency)
+        if self.kernel.runningPCB:
+            pcb.process_state = "ready"
+            self.add(pcb)
+        else:
+            self.dispatch(pcb)
+
+    def dispatch(self, pcb):
+        pcb.process_state = "running"
+        self.kernel.dispatcher.load(pcb)
+        self.kernel.running_pcb = pcb
+        self._started(pcb)
+
+    def _started(self, pcb):
+        self._startPc[pcb] = pcb.pc
+        self._minVruntime = max(self._minVruntime, self.vruntime(pcb))
+        self.kernel.hardware.timer.reset(self.timeslice(pcb))
+
+    def add(self, pcb):
+        self._totalWeight += self.weight(pcb)
+        self._ready_queue.push(pcb, (self.vruntime(pcb), next(self._arrivals)))
+
+    def first(self):
+        return self._ready_queue.peek()
+
+    def get_next(self):
+        next_pcb = self._ready_queue.pop()
+        if next_pcb is not None:
+            self._totalWeight -= self.weight(next_pcb)
+            self._started(next_pcb)
+        return next_pcb
+
+    def update_ready_queue(self):
+        #timeout: el que corre vuelve a la cola con su vruntime actualizado
+        current_process = self.kernel.running_pcb
+        if current_process:
+            self.kernel.dispatcher.save(current_process)
+            current_process.process_state = 'ready'
+            self._account(current_process)
+            self.add(current_process)
+
+        next_process = self.get_next()
+        if next_process:
+            next_process.process_state = 'running'
+            self.kernel.dispatcher.load(next_process)
+            self.kernel.running_pcb = next_process
+        else:
+            self.kernel.hardware.timer.reset()
+
+    def terminated(self, pcb):
+        self._vruntime.pop(pcb, None)
+        self._startPc.pop(pcb, None)
+
+    def is_empty(self):
+        return len(self._ready_queue) == 0
             
             
 #MEMORIA MANAGMENT
 
-class MemoryManager():
+## backing store de las paginas sucias desalojadas: (pid, pageId) -> contenido del frame
+class SwapSpace():
+
     def __init__(self):
-        self._freeFrames = []
-        totalFrames = HARDWARE.memory.size // HARDWARE.mmu.frameSize
-        
-        if not self._freeFrames:
-            self._freeFrames = list(range(totalFrames))
+        self._pages = dict()
+        self._writes = 0
+        self._reads = 0
+
+    def store(self, pid, pageId, cells):
+        self._pages[(pid, pageId)] = cells
+        self._writes += 1
+
+    def contains(self, pid, pageId):
+        return (pid, pageId) in self._pages
+
+    #la copia queda en el swap: si la pagina se vuelve a desalojar sin escribirse sigue valiendo
+    def load(self, pid, pageId):
+        self._reads += 1
+        return self._pages[(pid, pageId)]
+
+    #el proceso termino: sus paginas en swap ya no sirven
+    def discard(self, pid):
+        for key in [key for key in self._pages if key[0] == pid]:
+            del self._pages[key]
+
+    @property
+    def writes(self):
+        return self._writes
+
+    @property
+    def reads(self):
+        return self._reads
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __repr__(self):
+        return "SwapSpace pages: {pages} writes: {writes} reads: {reads}".format(pages=len(self._pages), writes=self._writes, reads=self._reads)
+
+
+class MemoryManager():
+    #frames libres: cola (alloc y free O(1), se reusan en el orden en que se liberan) + bitmap
+    #para detectar frees repetidos. Mapa inverso frame -> [(pid, pageId)] y frames de cada proceso.
+    #Las paginas de codigo se comparten entre los procesos que corren el mismo programa: el page
+    #cache va de (path, pageId) al frame cargado y el refcount de un frame es cuantos lo mapean
+    def __init__(self, hardware, replacementPolicy=None, readAhead=None):
+        self._hardware = hardware
+        totalFrames = self._hardware.memory.size // self._hardware.mmu.frameSize
+        self._freeFrames = deque(range(totalFrames))
+        self._isFree = bytearray(b'\x01') * totalFrames
+        self._owners = [None] * totalFrames
+        self._framesByPid = dict()
+        self._pageCache = dict()
+        self._cacheKeys = [None] * totalFrames
+        self._sharedMappings = 0
+        self._pinned = dict()   # frames traidos del swap que su proceso todavia no uso
+        self._readAhead = readAhead
+        if readAhead is not None:
+            readAhead.attach(hardware)
+
+        if replacementPolicy is None:
+            replacementPolicy = LRUReplacementPolicy()
+        replacementPolicy.attach(hardware)
+        self._replacementPolicy = replacementPolicy
     
+    #fork: las tablas por frame se copian de una vez; de los duenios solo se copian las listas
+    #de los frames cargados (el resto son None)
+    def __deepcopy__(self, memo):
+        clone = MemoryManager.__new__(MemoryManager)
+        memo[id(self)] = clone
+        for name, value in self.__dict__.items():
+            if name in ('_freeFrames', '_isFree', '_cacheKeys'):
+                clone.__dict__[name] = copy.copy(value)
+            elif name != '_owners':
+                clone.__dict__[name] = copy.deepcopy(value, memo)
+        clone._owners = self._owners[:]
+        for owned in self._framesByPid.values():
+            for frame in owned:
+                clone._owners[frame] = self._owners[frame][:]
+        return clone
+
     def alloc(self):
         log.logger.info(self._freeFrames)
         if self._freeFrames:
-            return self._freeFrames.pop(0)  # Devuelve el primer marco libre
+            frame = self._freeFrames.popleft()  # Devuelve el primer marco libre
+            self._isFree[frame] = 0
+            return frame
         else:
             return None  # No hay marcos disponibles
     
-    def free(self, frame):
-        self._freeFrames.extend(frame)
+    def free(self, frames):
+        for frame in frames:
+            if self._isFree[frame]:
+                raise Exception("Frame {frame} is already free".format(frame=frame))
+            self._isFree[frame] = 1
+            self._disown(frame)
+            self._pinned.pop(frame, None)
+            if self._readAhead is not None:
+                self._readAhead.frameFreed(frame)
+            self._hardware.mmu.frameFreed(frame)
+            self._replacementPolicy.frameFreed(frame)
+            self._freeFrames.append(frame)
+
+    #el proceso suelta todos sus frames (en orden de pagina); los compartidos
+    #se liberan recien cuando los suelta el ultimo proceso que los mapea
+    def freeProcess(self, pid):
+        frames = []
+        for frame, pageId in self.framesOf(pid):
+            if len(self._owners[frame]) > 1:
+                self.unmap(frame, pid)
+            else:
+                frames.append(frame)
+        self.free(frames)
+
+    #[(frame, pageId)] que tiene mapeados el proceso, en orden de pagina
+    def framesOf(self, pid):
+        owned = self._framesByPid.get(pid, {})
+        return sorted(owned.items(), key=lambda item: item[1])
+
+    #se cargo la pagina pageId del pcb en el frame
+    #shareable: es la pagina tal cual esta en el programa (no vino del swap) y la pueden usar otros
+    def frameLoaded(self, frame, pcb, pageId, shareable=True):
+        self._disown(frame)
+        self._owners[frame] = [(pcb.process_id, pageId)]
+        self._framesByPid.setdefault(pcb.process_id, dict())[frame] = pageId
+        key = (pcb.path, pageId)
+        if shareable and key not in self._pageCache:
+            self._pageCache[key] = frame
+            self._cacheKeys[frame] = key
+        self._hardware.mmu.frameLoaded(frame)
+        self._replacementPolicy.frameLoaded(frame, pcb, pageId)
+
+    #frame donde ya esta cargada (y sin modificar) la pagina pageId del programa, o None
+    def cachedFrame(self, path, pageId):
+        frame = self._pageCache.get((path, pageId))
+        if frame is not None and not self._hardware.mmu.dirty[frame]:
+            return frame
+        return None
+
+    #mapea en el pcb un frame que ya esta cargado para otro proceso
+    #mientras lo mapee mas de un proceso el frame es de solo lectura
+    def share(self, frame, pcb, pageId):
+        self._owners[frame].append((pcb.process_id, pageId))
+        self._framesByPid.setdefault(pcb.process_id, dict())[frame] = pageId
+        self._sharedMappings += 1
+        self._hardware.mmu.setReadOnly(frame)
+
+    #al crear el proceso le mapea las paginas de su programa que ya estan en memoria
+    def mapShared(self, pcb):
+        for pageId in pcb.pageTable:
+            frame = self.cachedFrame(pcb.path, pageId)
+            if frame is not None:
+                pcb.pageTable[pageId] = frame
+                self.share(frame, pcb, pageId)
+
+    #[(pid, pageId)] de los procesos que tienen mapeado el frame (vacio si esta libre)
+    def owners(self, frame):
+        return self._owners[frame] or []
+
+    def refCount(self, frame):
+        return len(self.owners(frame))
+
+    #el proceso deja de mapear un frame que comparte con otros
+    def unmap(self, frame, pid):
+        self._owners[frame] = [owner for owner in self._owners[frame] if owner[0] != pid]
+        if len(self._owners[frame]) == 1:
+            self._hardware.mmu.setReadOnly(frame, False)
+        owned = self._framesByPid[pid]
+        del owned[frame]
+        if not owned:
+            del self._framesByPid[pid]
+
+    def _disown(self, frame):
+        owners = self._owners[frame]
+        if owners is not None:
+            self._owners[frame] = None
+            for pid, pageId in owners:
+                owned = self._framesByPid[pid]
+                del owned[frame]
+                if not owned:
+                    del self._framesByPid[pid]
+        key = self._cacheKeys[frame]
+        if key is not None:
+            del self._pageCache[key]
+            self._cacheKeys[frame] = None
+
+    #cantidad de veces que se mapeo un frame ya cargado en vez de cargar una copia
+    @property
+    def sharedMappings(self):
+        return self._sharedMappings
+
+    @property
+    def readAhead(self):
+        return self._readAhead
+
+    #el frame no se desaloja hasta que se referencie: asi el proceso que espero la pagina
+    #llega a usarla aunque vuelva al final de la ready queue (si no, con mas procesos que
+    #frames cada page fault desaloja la pagina que otro acaba de traer y nadie avanza)
+    def pin(self, frame):
+        self._pinned[frame] = True
+
+    def _unpinUsed(self):
+        useCount = self._hardware.mmu.useCount
+        for frame in [frame for frame in self._pinned if useCount[frame]]:
+            del self._pinned[frame]
+
+    def selectVictim(self):
+        self._unpinUsed()
+        return self._replacementPolicy.selectVictim(self._pinned)
+
+    #hay un frame libre o alguno cargado que se puede desalojar
+    def hasVictim(self):
+        if self._freeFrames:
+            return True
+        self._unpinUsed()
+        return any(frame not in self._pinned for frame in self._hardware.mmu.access)
     
     @property
     def freeFrames(self):
         return self._freeFrames
 
+    @property
+    def replacementPolicy(self):
+        return self._replacementPolicy
+
+    #se cambia "en frio", antes de que haya paginas cargadas
+    @replacementPolicy.setter
+    def replacementPolicy(self, replacementPolicy):
+        replacementPolicy.attach(self._hardware)
+        self._replacementPolicy = replacementPolicy
+
+
+#Lectura anticipada secuencial: los programas se ejecutan casi siempre en orden, asi que en un
+#page fault se adelantan las window paginas siguientes. La ventana se adapta a lo observado:
+#crece de a una con cada pagina adelantada que se llega a usar y se divide por dos con cada
+#una que se libera sin usarse
+class ReadAhead():
+
+    def __init__(self, window=2, minWindow=1, maxWindow=16):
+        self._window = window
+        self._minWindow = minWindow
+        self._maxWindow = maxWindow
+        self._pending = dict()  # frames adelantados que todavia no se usaron
+        self._prefetched = 0
+        self._hits = 0
+        self._wasted = 0
+        self._hardware = None
+
+    #la maquina cuyos frames se adelantan (la fija el MemoryManager)
+    def attach(self, hardware):
+        self._hardware = hardware
+
+    #paginas siguientes a pageId (dentro del programa) que el pcb todavia no tiene cargadas
+    def pages(self, pcb, pageId):
+        pageTable = pcb.pageTable
+        return [page for page in range(pageId + 1, pageId + 1 + self._window)
+                if page in pageTable and pageTable[page] is None]
+
+    def prefetched(self, frame):
+        self._pending[frame] = True
+        self._prefetched += 1
+
+    #las paginas adelantadas que ya se referenciaron fueron aciertos
+    def update(self):
+        useCount = self._hardware.mmu.useCount
+        for frame in [frame for frame in self._pending if useCount[frame]]:
+            del self._pending[frame]
+            self._hit()
+
+    def frameFreed(self, frame):
+        if self._pending.pop(frame, None):
+            if self._hardware.mmu.useCount[frame]:
+                self._hit()
+            else:
+                self._wasted += 1
+                self._window = max(self._minWindow, self._window // 2)
+
+    def _hit(self):
+        self._hits += 1
+        self._window = min(self._maxWindow, self._window + 1)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def prefetchedPages(self):
+        return self._prefetched
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def wasted(self):
+        return self._wasted
+
+    def __repr__(self):
+        return "ReadAhead window: {window} prefetched: {prefetched} hits: {hits} wasted: {wasted}".format(
+            window=self._window, prefetched=self._prefetched, hits=self._hits, wasted=self._wasted)
+
+
+#Working set de un proceso: las paginas que referencio en los ultimos window ticks
+#(segun el tick de ultimo acceso que registra el MMU en cada frame)
+class WorkingSetEstimator():
+
+    def __init__(self, kernel, window=10):
+        self._kernel = kernel
+        self._window = window
+
+    def estimate(self, pcb):
+        frameTable = self._kernel.hardware.mmu.frameTable
+        since = self._kernel.hardware.clock.currentTick - self._window
+        return sum(1 for frame, pageId in self._kernel.memoryManager.framesOf(pcb.process_id)
+                   if frameTable.lastUse(frame) >= since)
+
+    @property
+    def window(self):
+        return self._window
+
+
+#Control de admision por frecuencia de page faults (PFF): si en los ultimos interval ticks hubo
+#mas de upperFaultRate page faults por tick, el proceso que hace el page fault se suspende (se le
+#sacan todas sus paginas) y los que llegan esperan afuera. Los suspendidos vuelven, de a uno y en
+#orden, cuando la frecuencia baja de lowerFaultRate y hay frames libres para su working set.
+#Nunca se deja la maquina sin procesos activos (listos, corriendo o esperando IO)
+class PFFAdmissionControl():
+
+    def __init__(self, kernel, upperFaultRate=0.3, lowerFaultRate=0.1, interval=20, estimator=None):
+        self._kernel = kernel
+        self._upperFaultRate = upperFaultRate
+        self._lowerFaultRate = lowerFaultRate
+        self._interval = interval
+        self._estimator = estimator if estimator else WorkingSetEstimator(kernel)
+        self._faults = deque()          # ticks de los page faults recientes
+        self._suspended = ProcessQueue()
+        self._workingSets = dict()      # pcb -> working set estimado al suspenderlo
+        self._suspensions = 0
+        self._resumes = 0
+
+    def faultOccurred(self):
+        self._faults.append(self._kernel.hardware.clock.currentTick)
+
+    def faultRate(self):
+        since = self._kernel.hardware.clock.currentTick - self._interval
+        while self._faults and self._faults[0] <= since:
+            self._faults.popleft()
+        return len(self._faults) / self._interval
+
+    #procesos activos sin contar a pcb
+    def _othersActive(self, pcb):
+        return any(other is not pcb and other.state not in ("terminated", "suspended")
+                   for other in self._kernel.getPCBTable)
+
+    #un proceso nuevo entra si no hay demasiados page faults (o si no hay otro activo)
+    def admit(self, pcb):
+        if self.faultRate() > self._upperFaultRate and self._othersActive(pcb):
+            pcb.process_state = "suspended"
+            self._workingSets[pcb] = 1
+            self._suspended.add(pcb)
+            self._suspensions += 1
+            return False
+        return True
+
+    def mustSuspend(self, pcb):
+        return self.faultRate() > self._upperFaultRate and self._othersActive(pcb)
+
+    #suspende al proceso que esta corriendo: le saca sus paginas y despacha al siguiente
+    def suspend(self, pcb):
+        kernel = self._kernel
+        self._workingSets[pcb] = max(1, self._estimator.estimate(pcb))
+        kernel.dispatcher.save(pcb)
+        kernel.pageFaultHandler.swapOut(pcb)
+        pcb.process_state = "suspended"
+        self._suspended.add(pcb)
+        self._suspensions += 1
+        log.logger.info("Suspending {pcb}, working set: {ws}".format(pcb=pcb.process_id, ws=self._workingSets[pcb]))
+
+        kernel.running_pcb = None
+        if not kernel.scheduler.is_empty():
+            next_pcb = kernel.scheduler.get_next()
+            kernel.dispatcher.load(next_pcb)
+            next_pcb.process_state = "running"
+            kernel.running_pcb = next_pcb
+
+    def resumeIfApply(self):
+        while not self._suspended.is_empty():
+            pcb = self._suspended.first()
+            if self._othersActive(pcb) and (self.faultRate() > self._lowerFaultRate or
+                                            len(self._kernel.memoryManager.freeFrames) < self._workingSets[pcb]):
+                return
+            self._suspended.pop()
+            del self._workingSets[pcb]
+            self._resumes += 1
+            log.logger.info("Resuming {pcb}".format(pcb=pcb.process_id))
+            self._kernel.scheduler.manage(pcb)
+
+    @property
+    def suspended(self):
+        return self._suspended
+
+    @property
+    def suspensions(self):
+        return self._suspensions
+
+    @property
+    def resumes(self):
+        return self._resumes
+
+    def __repr__(self):
+        return "PFFAdmissionControl suspended: {suspended} suspensions: {suspensions} resumes: {resumes}".format(
+            suspended=len(self._suspended), suspensions=self._suspensions, resumes=self._resumes)
+
+
+#Politicas de reemplazo de paginas
+#Todas eligen un frame victima entre los frames cargados que no estan en pinned
+
+class PageReplacementPolicy():
+    _hardware = None
+
+    #la maquina cuyos frames administra (la fija el MemoryManager)
+    def attach(self, hardware):
+        self._hardware = hardware
+
+    def frameLoaded(self, frame, pcb, pageId):
+        pass
+
+    def frameFreed(self, frame):
+        pass
+
+    def selectVictim(self, pinned=()):
+        log.logger.error("-- SELECT VICTIM MUST BE OVERRIDEN in class {classname}".format(classname=self.__class__.__name__))
+
+
+class FIFOReplacementPolicy(PageReplacementPolicy):
+    #victima: el frame cargado hace mas tiempo
+    def __init__(self):
+        self._loaded = OrderedDict()
+
+    def frameLoaded(self, frame, pcb, pageId):
+        self._loaded[frame] = True
+        self._loaded.move_to_end(frame)
+
+    def frameFreed(self, frame):
+        self._loaded.pop(frame, None)
+
+    def selectVictim(self, pinned=()):
+        return next((frame for frame in self._loaded if frame not in pinned), None)
+
+
+class LRUReplacementPolicy(PageReplacementPolicy):
+    #victima: el frame usado hace mas tiempo (el MMU mantiene el orden)
+    def selectVictim(self, pinned=()):
+        return self._hardware.mmu.leastRecentlyUsed(pinned)
+
+
+class ClockReplacementPolicy(PageReplacementPolicy):
+    #segunda oportunidad: la aguja saltea (y limpia) los frames con el bit de referencia en 1
+    def __init__(self):
+        self._loaded = set()
+        self._hand = 0
+
+    def frameLoaded(self, frame, pcb, pageId):
+        self._loaded.add(frame)
+
+    def frameFreed(self, frame):
+        self._loaded.discard(frame)
+
+    def selectVictim(self, pinned=()):
+        if all(frame in pinned for frame in self._loaded):
+            return None
+        referenced = self._hardware.mmu.referenced
+        totalFrames = len(referenced)
+        while True:
+            frame = self._hand
+            self._hand = (self._hand + 1) % totalFrames
+            if frame in self._loaded and frame not in pinned:
+                if referenced[frame]:
+                    self._hardware.mmu.clearReferenced(frame)
+                else:
+                    return frame
+
+
+class LFUReplacementPolicy(PageReplacementPolicy):
+    #victima: el frame con menos usos desde que se cargo (empate: el menos recientemente usado)
+    def selectVictim(self, pinned=()):
+        useCount = self._hardware.mmu.useCount
+        return min((frame for frame in self._hardware.mmu.access if frame not in pinned),
+                   key=lambda frame: useCount[frame], default=None)
+
+
+class OptimalReplacementPolicy(PageReplacementPolicy):
+    #Belady (offline): necesita la traza de referencias (pid, pageId) grabada con
+    #hardware.mmu.recordTrace() en una corrida previa del mismo workload.
+    #victima: la pagina cuyo proximo uso esta mas lejos en la traza
+    def __init__(self, trace):
+        self._uses = dict()
+        for position, key in enumerate(trace):
+            self._uses.setdefault(key, []).append(position)
+        self._loaded = dict()
+
+    def frameLoaded(self, frame, pcb, pageId):
+        self._loaded[frame] = (pcb.process_id, pageId)
+
+    def frameFreed(self, frame):
+        self._loaded.pop(frame, None)
+
+    def nextUse(self, key, position):
+        uses = self._uses.get(key, [])
+        index = bisect_left(uses, position)
+        return uses[index] if index < len(uses) else float('inf')
+
+    def selectVictim(self, pinned=()):
+        position = self._hardware.mmu.references
+        return max((frame for frame in self._loaded if frame not in pinned), key=lambda frame: self.nextUse(self._loaded[frame], position), default=None)
+
  
 #File System
 class FileSystem():
@@ -658,29 +2116,26 @@ class FileSystem():
     
     def read(self, path):
         return self._fileSystem[path]
+
+    def programs(self):
+        return self._fileSystem.values()
     
            
 
 #Gantt
 class GanttDiagram():
+    #celda de cada estado del PCB
+    STATE_CELLS = {'new': "NEW", 'ready': "READY", 'running': "RUN", 'waiting': "WAIT",
+                   'suspended': "SUSP", 'terminated': "END"}
+
     def __init__(self, kernel):
         self.kernel = kernel
         self.diagrama = []
         
+
     def stateAct(self):
-        row = []
         # Por cada proceso en la tabla PCB, guardo su estado en este tick
-        for pcb in self.kernel.getPCBTable:
-            if pcb.state == 'terminated':
-                row.append("END")
-            elif pcb.state == 'running':
-                row.append("RUN")
-            elif pcb.state == 'waiting':
-                row.append("WAIT")
-            elif pcb.state == 'ready':
-                row.append("READY")
-            else:
-                row.append("NOOOOOOOOOOOOO")#No deberia haber otro estado
+        row = [self.STATE_CELLS[pcb.state] for pcb in self.kernel.getPCBTable]
         self.diagrama.append(row)
         
     def print(self):